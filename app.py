@@ -1,33 +1,113 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt 
 import os
+import click
+import json
+import base64
+import hashlib
+import io
 import logging
+import subprocess
+import sys
+import time
+import zipfile
+from collections import defaultdict
+from functools import wraps
 from flask_migrate import Migrate
+from sqlalchemy import insert, update
+from sqlalchemy.dialects import mysql
+from datetime import datetime, timezone
 from dotenv import load_dotenv
-import ocr  
-import label_detection
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+# ocr and label_detection (paddle, OpenCV) and export (pyarrow) are imported
+# where they are used, so processes that only serve the API or run migrations
+# never load them; warm_up() loads the pipeline ahead of the first upload
+import jobs
+import result_cache
+import units
+import metrics
+import auth
+import compression
+import db_config
+import storage
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 app = Flask(__name__)
 CORS(app)  
 
 load_dotenv()
 
-username = os.getenv('DATABASE_USER', 'default_user')
-password = os.getenv('DATABASE_PASSWORD', 'default_password')
-host = os.getenv('DATABASE_HOST', 'localhost')
-database = os.getenv('DATABASE_NAME', 'default_db')
-
-app.config['SQLALCHEMY_DATABASE_URI'] = f"mysql+pymysql://{username}:{password}@{host}/{database}"
+db_config.configure(app)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+# larger request bodies are refused with 413 before any of them is read
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_REQUEST_BYTES', 512 * 1024 * 1024)) or None
 
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': db_config.RoutingSession})
+with app.app_context():
+    db_config.instrument(db)
 bcrypt = Bcrypt(app)
 migrate = Migrate(app, db)
 
 logging.basicConfig(level=logging.DEBUG)
 
+if not app.config['SECRET_KEY']:
+    logging.warning("SECRET_KEY is not set, using a random key: tokens will not survive a restart")
+    app.config['SECRET_KEY'] = os.urandom(32).hex()
+
+tokens = auth.TokenAuth(
+    app.config['SECRET_KEY'],
+    max_age=int(os.getenv('TOKEN_MAX_AGE', 43200)),
+    cache_size=int(os.getenv('TOKEN_CACHE_SIZE', 1024))
+)
+passwords = auth.PasswordHasher(bcrypt, workers=int(os.getenv('AUTH_WORKERS', 2)))
+
+job_runner = jobs.JobRunner(
+    max_workers=int(os.getenv('JOB_WORKERS', 2)),
+    max_pending=int(os.getenv('JOB_QUEUE_SIZE', 16)),
+    directory=os.getenv('JOB_STATUS_DIR') or None,
+    max_age=int(os.getenv('JOB_STATUS_MAX_AGE', 86400))
+)
+
+SAVE_UPLOADS = os.getenv('SAVE_UPLOADS', '1') == '1'
+BULK_MAX_FILES = int(os.getenv('BULK_MAX_FILES', 500))
+# images of one bulk request after zip members are expanded, all held in memory until its job is done
+BULK_MAX_BYTES = int(os.getenv('BULK_MAX_BYTES', app.config['MAX_CONTENT_LENGTH'] or 0)) or None
+BULK_CHUNK_SIZE = int(os.getenv('BULK_CHUNK_SIZE', 16))
+BULK_WORKERS = int(os.getenv('BULK_WORKERS', 2))
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', 2))
+MAX_IMAGE_BYTES = 25 * 1024 * 1024
+disk_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='disk')
+
+blob_store = storage.BlobStore(
+    directory=os.getenv('STORAGE_DIR', 'storage'),
+    max_bytes=int(os.getenv('STORAGE_MAX_BYTES', 10 * 1024 ** 3)),
+    max_age=int(os.getenv('STORAGE_MAX_AGE', 30 * 86400)),
+    grace=int(os.getenv('STORAGE_GRACE', 300))
+)
+STORAGE_SWEEP_INTERVAL = int(os.getenv('STORAGE_SWEEP_INTERVAL', 600))
+
+label_cache = result_cache.ResultCache(
+    directory=os.getenv('RESULT_CACHE_DIR', 'cache/labels'),
+    max_entries=int(os.getenv('RESULT_CACHE_SIZE', 1024)),
+    max_bytes=int(os.getenv('RESULT_CACHE_MAX_BYTES', 1024 ** 3)),
+    max_age=int(os.getenv('RESULT_CACHE_MAX_AGE', 30 * 86400))
+)
+
+CACHE_LOOKUPS = metrics.Counter('label_cache_lookups_total', "Result cache lookups by outcome.", ['result'])
+CACHE_LOOKUPS.set_function(lambda: {
+    (result,): label_cache.stats()[key]
+    for result, key in [('memory_hit', 'memory_hits'), ('disk_hit', 'disk_hits'), ('miss', 'misses')]
+})
+CACHE_ENTRIES = metrics.Gauge('label_cache_entries_in_memory', "Results held in the in-memory cache.")
+CACHE_ENTRIES.set_function(lambda: label_cache.stats()['entries_in_memory'])
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(100), unique=True, nullable=False)
@@ -36,8 +116,19 @@ class User(db.Model):
     def __repr__(self):
         return f"<User {self.email}>"
 
+TIMESTAMP = db.DateTime().with_variant(mysql.DATETIME(fsp=6), 'mysql')
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 class Nutrition(db.Model):
+    __table_args__ = (
+        db.Index('ix_nutrition_user_id_id', 'user_id', 'id'),
+        db.Index('ix_nutrition_user_id_updated_at', 'user_id', 'updated_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     servings_size = db.Column(db.String(100))
     servings_per_container = db.Column(db.String(100))
     calories_per_serving = db.Column(db.String(100))
@@ -70,12 +161,134 @@ class Nutrition(db.Model):
     potassium_amount = db.Column(db.String(100))
     potassium_dv = db.Column(db.String(100))
 
+    # numeric copies of the strings above in canonical units, see units.py
+    servings_per_container_count = db.Column(db.Float)
+    calories_kcal = db.Column(db.Float, index=True)
+    total_fat_g = db.Column(db.Float, index=True)
+    total_fat_dv_pct = db.Column(db.Float)
+    saturated_fat_g = db.Column(db.Float, index=True)
+    saturated_fat_dv_pct = db.Column(db.Float)
+    trans_fat_g = db.Column(db.Float)
+    trans_fat_dv_pct = db.Column(db.Float)
+    cholesterol_mg = db.Column(db.Float)
+    cholesterol_dv_pct = db.Column(db.Float)
+    sodium_mg = db.Column(db.Float, index=True)
+    sodium_dv_pct = db.Column(db.Float)
+    total_carbohydrates_g = db.Column(db.Float)
+    total_carbohydrates_dv_pct = db.Column(db.Float)
+    dietary_fiber_g = db.Column(db.Float)
+    dietary_fiber_dv_pct = db.Column(db.Float)
+    total_sugars_g = db.Column(db.Float, index=True)
+    total_sugars_dv_pct = db.Column(db.Float)
+    added_sugars_g = db.Column(db.Float, index=True)
+    added_sugars_dv_pct = db.Column(db.Float)
+    protein_g = db.Column(db.Float, index=True)
+    protein_dv_pct = db.Column(db.Float)
+    vitamin_d_mcg = db.Column(db.Float)
+    vitamin_d_dv_pct = db.Column(db.Float)
+    calcium_mg = db.Column(db.Float)
+    calcium_dv_pct = db.Column(db.Float)
+    iron_mg = db.Column(db.Float)
+    iron_dv_pct = db.Column(db.Float)
+    potassium_mg = db.Column(db.Float)
+    potassium_dv_pct = db.Column(db.Float)
+
+    # OCR tier that read the label: fast or accurate (see ocr.OCR_TIER)
+    ocr_tier = db.Column(db.String(16))
+
+    # sha256 of the upload and of the encoded crop, their keys in blob_store
+    upload_sha256 = db.Column(db.String(64), index=True)
+    crop_sha256 = db.Column(db.String(64))
+
+    # OCR lines the row was parsed from (ocr.pack_boxes), for re-parsing without running OCR again;
+    # deferred so loading a row does not fetch it
+    ocr_raw = db.deferred(db.Column(db.LargeBinary().with_variant(mysql.MEDIUMBLOB(), 'mysql')))
+
+    # microsecond resolution, so an update within the same second still changes the listing ETag
+    created_at = db.Column(TIMESTAMP, nullable=False, default=utcnow)
+    updated_at = db.Column(TIMESTAMP, nullable=False, default=utcnow, onupdate=utcnow)
+
     def __repr__(self):
         return f"<Nutrition {self.id}>"
 
+# Nutrition string column -> key in ocr.extract_nutrition_info output
+NUTRITION_KEYS = {
+    'servings_size': "Serving Size",
+    'servings_per_container': "Servings per Container",
+    'calories_per_serving': "Calories",
+    'total_fat_amount': "Total Fat (Amount)",
+    'total_fat_dv': "Total Fat (Daily Value)",
+    'saturated_fat_amount': "Saturated Fat (Amount)",
+    'saturated_fat_dv': "Saturated Fat (Daily Value)",
+    'trans_fat_amount': "Trans Fat (Amount)",
+    'trans_fat_dv': "Trans Fat (Daily Value)",
+    'cholesterol_amount': "Cholesterol (Amount)",
+    'cholesterol_dv': "Cholesterol (Daily Value)",
+    'sodium_amount': "Sodium (Amount)",
+    'sodium_dv': "Sodium (Daily Value)",
+    'total_carbohydrates_amount': "Total Carbohydrates (Amount)",
+    'total_carbohydrates_dv': "Total Carbohydrates (Daily Value)",
+    'dietary_fiber_amount': "Dietary Fiber (Amount)",
+    'dietary_fiber_dv': "Dietary Fiber (Daily Value)",
+    'total_sugars_amount': "Total Sugars (Amount)",
+    'total_sugars_dv': "Total Sugars (Daily Value)",
+    'added_sugars_amount': "Added Sugars (Amount)",
+    'added_sugars_dv': "Added Sugars (Daily Value)",
+    'protein_amount': "Protein (Amount)",
+    'protein_dv': "Protein (Daily Value)",
+    'vitamin_d_amount': "Vitamin D (Amount)",
+    'vitamin_d_dv': "Vitamin D (Daily Value)",
+    'calcium_amount': "Calcium (Amount)",
+    'calcium_dv': "Calcium (Daily Value)",
+    'iron_amount': "Iron (Amount)",
+    'iron_dv': "Iron (Daily Value)",
+    'potassium_amount': "Potasium (Amount)",
+    'potassium_dv': "Potasium (Daily Value)"
+}
+
+NUTRITION_FIELDS = list(NUTRITION_KEYS)
+NUMERIC_FIELDS = units.NUMERIC_COLUMNS
+
+MAX_PAGE_SIZE = 1000
+LISTING_FORMATS = {'json': 'application/json', 'ndjson': 'application/x-ndjson', 'msgpack': 'application/x-msgpack'}
+LISTING_MIMETYPES = {mimetype: name for name, mimetype in LISTING_FORMATS.items()}
+STREAM_CHUNK_SIZE = 500
+EXPORT_COLUMNS = ['id', 'user_id', 'ocr_tier', 'created_at', 'updated_at'] + NUTRITION_FIELDS + NUMERIC_FIELDS
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 10_000))
+EXPORT_ROW_GROUP_SIZE = int(os.getenv('EXPORT_ROW_GROUP_SIZE', 100_000))
+
 def safe_get(data, key):
     return data.get(key) or ""
 
+def authenticated_user_id():
+    """user id from the request's Bearer token, or None"""
+    header = request.headers.get('Authorization', '')
+    scheme, _, token = header.partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    return tokens.verify(token.strip())
+
+def login_required(view):
+    """reject unauthenticated requests, otherwise expose the caller as g.user_id"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        user_id = authenticated_user_id()
+        if user_id is None:
+            return jsonify({"message": "Authentication required"}), 401
+        g.user_id = user_id
+        return view(*args, **kwargs)
+    return wrapper
+
+def nutrition_values(nutrition_data):
+    """Nutrition column values for parser output, strings plus their numeric forms"""
+    values = {column: nutrition_data.get(key) for column, key in NUTRITION_KEYS.items()}
+    values.update(units.numeric_values(values))
+    return values
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({"message": f"Request is larger than {app.config['MAX_CONTENT_LENGTH']} bytes"}), 413
+
 @app.route('/api/register', methods=['POST'])
 def register():
     data = request.json
@@ -88,7 +301,7 @@ def register():
     if User.query.filter_by(email=email).first():
         return jsonify({"message": "Email already exists"}), 400
 
-    password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+    password_hash = passwords.hash(password)
 
     new_user = User(email=email, password_hash=password_hash)
     db.session.add(new_user)
@@ -106,152 +319,736 @@ def login():
         return jsonify({"message": "Email and password are required"}), 400
 
     user = User.query.filter_by(email=email).first()
-    if user and bcrypt.check_password_hash(user.password_hash, password):
-        return jsonify({"message": "Login successful"}), 200
+    if user and passwords.check(user.password_hash, password):
+        return jsonify({"message": "Login successful", "token": tokens.issue(user.id), "expires_in": tokens.max_age}), 200
     else:
         return jsonify({"message": "Invalid email or password"}), 400
 
 @app.route('/api/food_labels_db', methods=['GET'])
+@login_required
 def get_food_labels_from_db():
+    """list the caller's stored labels in id order
+
+    Query parameters:
+      fields    comma separated columns to return (id is always included);
+                the numeric columns such as sodium_mg can be requested too
+      min_<numeric column>, max_<numeric column>
+                inclusive range filters run in the database, e.g. min_sodium_mg=500
+      cursor    return rows after this id; with limit, the next cursor is
+                sent in the X-Next-Cursor header while more rows remain
+      since_id  return only rows added after this id (incremental sync)
+      limit     page size, at most MAX_PAGE_SIZE
+      format    json (default), ndjson or msgpack (column names, then one
+                array per row; needs the msgpack package); all are streamed
+                from the DB
+
+    The response carries a weak ETag of the caller's rows (max id, count and
+    last update) plus the query, so a request with a matching If-None-Match
+    gets a 304 without reading any rows. Bodies are compressed with brotli
+    or gzip when the client accepts it.
+    """
+    fields = [f for f in request.args.get('fields', '').split(',') if f] or NUTRITION_FIELDS
+    unknown = set(fields) - set(NUTRITION_FIELDS) - set(NUMERIC_FIELDS) - {'id'}
+    if unknown:
+        return jsonify({"message": f"Unknown fields: {', '.join(sorted(unknown))}"}), 400
+    columns = ['id'] + [f for f in fields if f != 'id']
+
+    ranges = [(name, request.args.get(name, type=float)) for name in request.args
+              if name[:4] in ('min_', 'max_') and name[4:] in NUMERIC_FIELDS]
+    if any(value is None for _, value in ranges):
+        return jsonify({"message": "Range filters must be numbers"}), 400
+
+    after_id = max(request.args.get('cursor', 0, type=int), request.args.get('since_id', 0, type=int))
+    limit = request.args.get('limit', type=int)
+    if 'limit' in request.args and (limit is None or limit <= 0):
+        return jsonify({"message": "limit must be a positive integer"}), 400
+    body_format = request.args.get('format') or LISTING_MIMETYPES.get(request.accept_mimetypes.best, 'json')
+    if body_format not in LISTING_FORMATS:
+        return jsonify({"message": f"Unknown format: {body_format}"}), 400
+    if body_format == 'msgpack' and msgpack is None:
+        return jsonify({"message": "MessagePack is not available on this server"}), 406
+
     try:
-        food_labels = Nutrition.query.all()
-        result = [{
-            'id': label.id,
-            'servings_size': label.servings_size,
-            'servings_per_container': label.servings_per_container,
-            'calories_per_serving': label.calories_per_serving,
-            'total_fat_amount': label.total_fat_amount,
-            'total_fat_dv': label.total_fat_dv,
-            'saturated_fat_amount': label.saturated_fat_amount,
-            'saturated_fat_dv': label.saturated_fat_dv,
-            'trans_fat_amount': label.trans_fat_amount,
-            'trans_fat_dv': label.trans_fat_dv,
-            'cholesterol_amount': label.cholesterol_amount,
-            'cholesterol_dv': label.cholesterol_dv,
-            'sodium_amount': label.sodium_amount,
-            'sodium_dv': label.sodium_dv,
-            'total_carbohydrates_amount': label.total_carbohydrates_amount,
-            'total_carbohydrates_dv': label.total_carbohydrates_dv,
-            'dietary_fiber_amount': label.dietary_fiber_amount,
-            'dietary_fiber_dv': label.dietary_fiber_dv,
-            'total_sugars_amount': label.total_sugars_amount,
-            'total_sugars_dv': label.total_sugars_dv,
-            'added_sugars_amount': label.added_sugars_amount,
-            'added_sugars_dv': label.added_sugars_dv,
-            'protein_amount': label.protein_amount,
-            'protein_dv': label.protein_dv,
-            'vitamin_d_amount': label.vitamin_d_amount,
-            'vitamin_d_dv': label.vitamin_d_dv,
-            'calcium_amount': label.calcium_amount,
-            'calcium_dv': label.calcium_dv,
-            'iron_amount': label.iron_amount,
-            'iron_dv': label.iron_dv,
-            'potassium_amount': label.potassium_amount,
-            'potassium_dv': label.potassium_dv
-        } for label in food_labels]
-        return jsonify(result), 200
+        max_id, count, updated_at = listing_version(g.user_id)
+        etag = hashlib.sha1(f"{g.user_id}:{max_id}:{count}:{updated_at}:{body_format}:{request.query_string}".encode()).hexdigest()
+        if request.if_none_match.contains_weak(etag):
+            return conditional_headers(Response(status=304), etag, updated_at)
+
+        query = db.session.query(*[getattr(Nutrition, c) for c in columns]) \
+            .filter(Nutrition.user_id == g.user_id, Nutrition.id > after_id) \
+            .order_by(Nutrition.id) \
+            .execution_options(replica=True)
+        for name, value in ranges:
+            column = getattr(Nutrition, name[4:])
+            query = query.filter(column >= value if name.startswith('min_') else column <= value)
+
+        headers = {}
+        if limit:
+            limit = min(limit, MAX_PAGE_SIZE)
+            rows = query.limit(limit).all()
+            if len(rows) == limit:
+                headers['X-Next-Cursor'] = str(rows[-1].id)
+        else:
+            rows = stream_query(query, STREAM_CHUNK_SIZE)
+
+        if body_format == 'msgpack':
+            body = serialize_rows_msgpack(rows, columns)
+        else:
+            body = serialize_rows(rows, columns, body_format == 'ndjson')
+        encoding = compression.negotiate(request.accept_encodings)
+        if encoding:
+            body = compression.compress_stream(body, encoding)
+            headers['Content-Encoding'] = encoding
+
+        response = Response(stream_with_context(body), mimetype=LISTING_FORMATS[body_format], headers=headers)
+        return conditional_headers(response, etag, updated_at), 200
     except Exception as e:
         logging.error(f"Error: {e}")
         return jsonify({"message": "An error occurred"}), 500
 
+@app.route('/api/food_labels_db/latest', methods=['GET'])
+@login_required
+def get_latest_food_label():
+    label = Nutrition.query \
+        .filter(Nutrition.user_id == g.user_id) \
+        .order_by(Nutrition.id.desc()) \
+        .first()
+    if label is None:
+        return jsonify({"message": "No entries yet"}), 404
+
+    return jsonify({column: getattr(label, column) for column in ['id'] + NUTRITION_FIELDS}), 200
+
+def stream_query(query, chunk_size):
+    """rows of query, fetched chunk_size at a time once a streamed response starts reading them
+
+    Flask tears the app context down when the view returns, closing the
+    session the query was built on. Running it on the session of the context
+    stream_with_context pushes again returns its connection to the pool when
+    the stream ends, instead of whenever the old session is collected.
+    """
+    yield from query.with_session(db.session()).yield_per(chunk_size)
+
+def listing_version(user_id):
+    """(max id, row count, last update) of a user's rows, read from the indexes"""
+    return db.session.query(
+        db.func.max(Nutrition.id), db.func.count(Nutrition.id), db.func.max(Nutrition.updated_at)
+    ).filter(Nutrition.user_id == user_id).execution_options(replica=True).one()
+
+def conditional_headers(response, etag, updated_at):
+    """validators and caching headers shared by the 200 and 304 listing responses"""
+    response.set_etag(etag, weak=True)
+    if updated_at:
+        response.last_modified = updated_at
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.update(['Accept', 'Accept-Encoding', 'Authorization'])
+    return response
+
+def serialize_rows_msgpack(rows, columns):
+    """MessagePack stream of the column names followed by one array per row"""
+    packer = msgpack.Packer()
+    yield packer.pack(columns)
+    chunk = []
+    for row in rows:
+        chunk.append(packer.pack(list(row)))
+        if len(chunk) == STREAM_CHUNK_SIZE:
+            yield b''.join(chunk)
+            chunk = []
+    if chunk:
+        yield b''.join(chunk)
+
+def serialize_rows(rows, columns, ndjson=False):
+    """encode rows as a JSON array or NDJSON, yielding one chunk per STREAM_CHUNK_SIZE rows"""
+    chunk = []
+    first = True
+    if not ndjson:
+        yield '['
+    for row in rows:
+        chunk.append(json.dumps(dict(zip(columns, row))))
+        if len(chunk) == STREAM_CHUNK_SIZE:
+            yield encode_chunk(chunk, first, ndjson)
+            chunk, first = [], False
+    if chunk:
+        yield encode_chunk(chunk, first, ndjson)
+    if not ndjson:
+        yield ']'
+
+def encode_chunk(chunk, first, ndjson):
+    if ndjson:
+        return '\n'.join(chunk) + '\n'
+    return ('' if first else ',') + ','.join(chunk)
+
+def store_blob(data, key):
+    """write bytes to blob_store, run on the disk writer so requests never wait for it"""
+    try:
+        blob_store.put(data, key)
+    except Exception as e:
+        logging.error(f"Failed to store blob {key}: {e}")
+
+def cached_label(key):
+    """label record cached for key, or None, also when its crop has since been evicted from blob_store
+
+    Reprocessing such an upload stores its crop again, so new rows never
+    point at a missing crop. The nutrition values are parsed again from the
+    record's raw OCR output, so a parser change applies to cached uploads
+    as well as to rows updated by reparse.
+    """
+    record = label_cache.get(key)
+    if record and record.get('crop') and not blob_store.exists(record['crop']):
+        return None
+    if record and record.get('raw'):
+        import ocr
+        record = {**record, 'nutrition': ocr.parse_nutrition_info(ocr.unpack_boxes(record_ocr_raw(record)))}
+    return record
+
+def save_crop(crop, timings=None):
+    """encode a crop view as JPEG, queue it for blob_store and return its key"""
+    import label_detection
+    with metrics.timed(timings, 'store'):
+        data = label_detection.encode_image(crop, '.jpg')
+        key = hashlib.sha256(data).hexdigest()
+    disk_writer.submit(store_blob, data, key)
+    return key
+
+def read_label(image, timings):
+    """detect and ocr one decoded image, returning the record kept in the result cache"""
+    import label_detection
+    import ocr
+    with jobs.timed(timings, 'detection'):
+        cropped_image, box = label_detection.crop_labels([image], timings=timings)[0]
+    if cropped_image is None:
+        raise ValueError("No nutrition label detected in the image")
+    crop_hash = save_crop(cropped_image, timings) if SAVE_UPLOADS else None
+
+    with jobs.timed(timings, 'ocr'):
+        nutrition_data, ocr_tier, boxes = ocr.extract_nutrition(cropped_image, timings)
+    logging.info(f"Waited {timings['ocr_wait'] * 1000:.1f} ms for an OCR engine, read with the {ocr_tier} tier")
+    return {'nutrition': nutrition_data, 'box': box, 'tier': ocr_tier, 'crop': crop_hash, 'raw': packed_ocr(boxes)}
+
+def packed_ocr(boxes):
+    """raw OCR output as kept in label records: packed, then base64 encoded since records are stored as JSON"""
+    import ocr
+    return base64.b64encode(ocr.pack_boxes(boxes)).decode('ascii')
+
+def record_ocr_raw(record):
+    """ocr_raw column value for a label record; records cached before it was kept have none"""
+    return base64.b64decode(record['raw']) if record.get('raw') else None
+
+def store_label(record, user_id, upload_sha256, timings):
+    """insert the Nutrition row for a label record and return its id"""
+    new_entry = Nutrition(user_id=user_id, ocr_tier=record.get('tier'), upload_sha256=upload_sha256,
+                          crop_sha256=record.get('crop'), ocr_raw=record_ocr_raw(record),
+                          **nutrition_values(record['nutrition']))
+    with jobs.timed(timings, 'db'):
+        db.session.add(new_entry)
+        db.session.commit()
+    return new_entry.id
+
+def process_label(timings, data, filename, content_hash, user_id):
+    """detect, ocr and store one uploaded label, run on the job executor
+
+    The upload is decoded once from memory and the crop handed to OCR is a
+    view into that buffer; the crop is only stored (in the background) when
+    SAVE_UPLOADS is on.
+    """
+    import label_detection
+    with app.app_context():
+        with jobs.timed(timings, 'cache'):
+            record = cached = cached_label(content_hash)
+        if not cached:
+            with jobs.timed(timings, 'decode'):
+                image = label_detection.decode_image(data)
+            if image is None:
+                raise ValueError("The uploaded file is not a readable image")
+            record = read_label(image, timings)
+            label_cache.put(content_hash, record)
+
+        nutrition_id = store_label(record, user_id, content_hash, timings)
+        return {"nutrition_id": nutrition_id, "cached": bool(cached), "ocr_tier": record.get('tier')}
+
+def process_page(number, image, content_hash, user_id):
+    """detect, ocr and store one rendered PDF page, run on the PDF page executor
+
+    Returns the page's manifest entry and stage timings. Pages are cached
+    under the document hash, page number and render resolution.
+    """
+    import label_detection
+    timings = {}
+    entry = {'page': number, 'status': 'failed', 'error': None, 'cached': False, 'nutrition_id': None}
+    page_hash = hashlib.sha256(f"{content_hash}:{number}:{label_detection.PDF_DPI}".encode()).hexdigest()
+    with app.app_context():
+        try:
+            with jobs.timed(timings, 'cache'):
+                record = cached_label(page_hash)
+            entry['cached'] = bool(record)
+            if not record:
+                record = read_label(image, timings)
+                label_cache.put(page_hash, record)
+            entry.update(status='stored', nutrition_id=store_label(record, user_id, content_hash, timings))
+        except Exception as e:
+            db.session.rollback()
+            entry['error'] = str(e)
+    return entry, timings
+
+def process_pdf(timings, data, filename, content_hash, user_id):
+    """render a PDF page by page and process up to PDF_WORKERS pages at once, run on the job executor
+
+    A page is only rendered once a slot in the window is free, so at most
+    PDF_WORKERS + 1 pages are held in memory whatever the page count. Each
+    page's row is written as soon as that page is done; the job result lists
+    the rows in page order.
+    """
+    import label_detection
+    manifest = []
+
+    def collect(done):
+        for future in done:
+            entry, page_timings = future.result()
+            for stage, seconds in page_timings.items():
+                timings[stage] = timings.get(stage, 0.0) + seconds
+            manifest.append(entry)
+
+    pages = label_detection.pdf_pages(data)
+    pending = set()
+    with ThreadPoolExecutor(max_workers=PDF_WORKERS, thread_name_prefix='pdf') as executor:
+        while True:
+            with jobs.timed(timings, 'rasterize'):
+                page = next(pages, None)
+            if page is None:
+                break
+            if len(pending) >= PDF_WORKERS:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(executor.submit(process_page, *page, content_hash, user_id))
+        collect(wait(pending).done)
+
+    manifest.sort(key=lambda entry: entry['page'])
+    nutrition_ids = [entry['nutrition_id'] for entry in manifest if entry['status'] == 'stored']
+    return {"pages": len(manifest), "stored": len(nutrition_ids), "failed": len(manifest) - len(nutrition_ids),
+            "nutrition_ids": nutrition_ids, "manifest": manifest}
+
+def read_bulk_upload(files):
+    """one item per uploaded image, with zip archives expanded into their members
+
+    Raises ValueError as soon as there are more than BULK_MAX_FILES images
+    or they add up to more than BULK_MAX_BYTES; a zip member's size is
+    checked before it is decompressed. Images over MAX_IMAGE_BYTES are kept
+    as failed items without their data.
+    """
+    items = []
+    total = 0
+
+    def add(name, content_hash, data, size):
+        if size > MAX_IMAGE_BYTES:
+            items.append({'file': name, 'data': None, 'sha256': None, 'error': "File is too large"})
+        else:
+            items.append({'file': name, 'data': data, 'sha256': content_hash, 'error': None})
+        if len(items) > BULK_MAX_FILES:
+            raise ValueError(f"At most {BULK_MAX_FILES} files can be uploaded at once")
+
+    def reserve(size):
+        nonlocal total
+        total += size
+        if BULK_MAX_BYTES and total > BULK_MAX_BYTES:
+            raise ValueError(f"The uploaded images add up to more than {BULK_MAX_BYTES} bytes")
+
+    for file in files:
+        content_hash, data = storage.read_stream(file.stream)
+        if not file.filename.lower().endswith('.zip'):
+            if len(data) <= MAX_IMAGE_BYTES:
+                reserve(len(data))
+            add(file.filename, content_hash, data, len(data))
+            continue
+
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or info.filename.startswith('__MACOSX/'):
+                    continue
+                name = os.path.basename(info.filename)
+                if info.file_size > MAX_IMAGE_BYTES:
+                    add(name, None, None, info.file_size)
+                    continue
+                # reads stop at the declared size, so this bounds what is decompressed
+                reserve(info.file_size)
+                with archive.open(info) as member:
+                    member_hash, member_data = storage.read_stream(member)
+                add(name, member_hash, member_data, len(member_data))
+    return items
+
+def process_chunk(chunk):
+    """detect and ocr a chunk of bulk upload items
+
+    Returns the manifest entries, the label records as kept in the result
+    cache (None where an item failed) and the chunk's stage timings.
+    """
+    import label_detection
+    import ocr
+    timings = {}
+    entries = [{'file': item['file'], 'status': 'failed', 'error': item['error'], 'cached': False, 'nutrition_id': None}
+               for item in chunk]
+    results = [None] * len(chunk)
+
+    with jobs.timed(timings, 'cache'):
+        for i, item in enumerate(chunk):
+            if item['data'] is None:
+                continue
+            cached = cached_label(item['sha256'])
+            if cached:
+                results[i] = cached
+                entries[i]['cached'] = True
+
+    pending = [i for i, item in enumerate(chunk) if item['data'] is not None and results[i] is None]
+    with jobs.timed(timings, 'decode'):
+        images = [label_detection.decode_image(chunk[i]['data']) for i in pending]
+    for i, image in zip(pending, images):
+        if image is None:
+            entries[i]['error'] = "The uploaded file is not a readable image"
+    decoded = [(i, image) for i, image in zip(pending, images) if image is not None]
+    pending = [i for i, _ in decoded]
+
+    try:
+        with jobs.timed(timings, 'detection'):
+            crops = label_detection.crop_labels([image for _, image in decoded], timings=timings)
+
+        detected = []
+        for i, (cropped_image, box) in zip(pending, crops):
+            if cropped_image is None:
+                entries[i]['error'] = "No nutrition label detected in the image"
+                continue
+            crop_hash = save_crop(cropped_image, timings) if SAVE_UPLOADS else None
+            detected.append((i, cropped_image, box, crop_hash))
+
+        with jobs.timed(timings, 'ocr'):
+            nutrition = ocr.extract_nutrition_batch([cropped_image for _, cropped_image, _, _ in detected])
+            for (i, _, box, crop_hash), (nutrition_data, ocr_tier, boxes) in zip(detected, nutrition):
+                results[i] = {'nutrition': nutrition_data, 'box': box, 'tier': ocr_tier, 'crop': crop_hash,
+                              'raw': packed_ocr(boxes)}
+                label_cache.put(chunk[i]['sha256'], results[i])
+    except Exception as e:
+        logging.error(f"Bulk chunk failed: {e}")
+        for i in pending:
+            if results[i] is None and entries[i]['error'] is None:
+                entries[i]['error'] = str(e)
+
+    return entries, results, timings
+
+def insert_rows(rows):
+    """insert Nutrition rows with one executemany, returning their ids where the database can report them"""
+    statement = insert(Nutrition)
+    if db.engine.dialect.insert_executemany_returning:
+        ids = db.session.scalars(statement.returning(Nutrition.id, sort_by_parameter_order=True), rows).all()
+    else:
+        db.session.execute(statement, rows)
+        ids = [None] * len(rows)
+    db.session.commit()
+    return ids
+
+def process_bulk(timings, items, user_id):
+    """process bulk upload items chunk by chunk, BULK_WORKERS chunks at a time, run on the job executor
+
+    Each chunk is written with a single batched insert; the job result is a
+    manifest with one entry per file.
+    """
+    chunks = [items[i:i + BULK_CHUNK_SIZE] for i in range(0, len(items), BULK_CHUNK_SIZE)]
+    manifest = []
+    with app.app_context(), ThreadPoolExecutor(max_workers=BULK_WORKERS, thread_name_prefix='bulk') as executor:
+        for chunk, (entries, results, chunk_timings) in zip(chunks, executor.map(process_chunk, chunks)):
+            for stage, seconds in chunk_timings.items():
+                timings[stage] = timings.get(stage, 0.0) + seconds
+
+            stored = [(entry, result, item) for entry, result, item in zip(entries, results, chunk) if result is not None]
+            if stored:
+                rows = [{'user_id': user_id, 'ocr_tier': result.get('tier'), 'upload_sha256': item['sha256'],
+                         'crop_sha256': result.get('crop'), 'ocr_raw': record_ocr_raw(result),
+                         **nutrition_values(result['nutrition'])}
+                        for _, result, item in stored]
+                with jobs.timed(timings, 'db'):
+                    ids = insert_rows(rows)
+                for (entry, _, _), nutrition_id in zip(stored, ids):
+                    entry.update(status='stored', nutrition_id=nutrition_id)
+            manifest.extend(entries)
+
+    failed = sum(entry['status'] == 'failed' for entry in manifest)
+    return {"files": len(manifest), "stored": len(manifest) - failed, "failed": failed, "manifest": manifest}
+
 @app.route('/api/food_labels_db', methods=['POST'])
+@login_required
 def upload_food_label():
     if 'file' not in request.files:
         return jsonify({"message": "No file provided"}), 400
 
     file = request.files['file']
+    with metrics.timed(None, 'receive'):
+        content_hash, data = storage.read_stream(file.stream)
 
-    file_path = f"uploads/{file.filename}"
-    os.makedirs("uploads", exist_ok=True)
-    file.save(file_path)
+    import label_detection
+    pdf = label_detection.is_pdf(data)
+    if pdf and not label_detection.pdf_supported():
+        return jsonify({"message": "PDF uploads are not supported on this server"}), 415
 
-    cropped_image_path = f"cropped_image/{file.filename}"
-    os.makedirs("cropped_image", exist_ok=True)
+    if SAVE_UPLOADS:
+        disk_writer.submit(store_blob, data, content_hash)
 
     try:
-        cropped_image = label_detection.crop_label(file_path)
-        cropped_image.save(cropped_image_path)
-        
-        if cropped_image:
-            nutrition_data = ocr.extract_nutrition_info(cropped_image)
-        else:
-            print("No cropped image available.")
-
-        servings_size=nutrition_data.get("Serving Size")
-        servings_per_container=nutrition_data.get("Servings per Container")
-        calories_per_serving=nutrition_data.get("Calories")
-        total_fat_amount=nutrition_data.get("Total Fat (Amount)")
-        total_fat_dv=nutrition_data.get("Total Fat (Daily Value)")
-        saturated_fat_amount=nutrition_data.get("Saturated Fat (Amount)")
-        saturated_fat_dv=nutrition_data.get("Saturated Fat (Daily Value)")
-        trans_fat_amount=nutrition_data.get("Trans Fat (Amount)")
-        trans_fat_dv=nutrition_data.get("Trans Fat (Daily Value)")
-        cholesterol_amount=nutrition_data.get("Cholesterol (Amount)")
-        cholesterol_dv=nutrition_data.get("Cholesterol (Daily Value)")
-        sodium_amount=nutrition_data.get("Sodium (Amount)")
-        sodium_dv=nutrition_data.get("Sodium (Daily Value)")
-        total_carbohydrates_amount=nutrition_data.get("Total Carbohydrates (Amount)")
-        total_carbohydrates_dv=nutrition_data.get("Total Carbohydrates (Daily Value)")
-        dietary_fiber_amount=nutrition_data.get("Dietary Fiber (Amount)")
-        dietary_fiber_dv=nutrition_data.get("Dietary Fiber (Daily Value)")
-        total_sugars_amount=nutrition_data.get("Total Sugars (Amount)")
-        total_sugars_dv=nutrition_data.get("Total Sugars (Daily Value)")
-        added_sugars_amount=nutrition_data.get("Added Sugars (Amount)")
-        added_sugars_dv=nutrition_data.get("Added Sugars (Daily Value)")
-        protein_amount=nutrition_data.get("Protein (Amount)")
-        protein_dv=nutrition_data.get("Protein (Daily Value)")
-        vitamin_d_amount=nutrition_data.get("Vitamin D (Amount)")
-        vitamin_d_dv=nutrition_data.get("Vitamin D (Daily Value)")
-        calcium_amount=nutrition_data.get("Calcium (Amount)")
-        calcium_dv=nutrition_data.get("Calcium (Daily Value)")
-        iron_amount=nutrition_data.get("Iron (Amount)")
-        iron_dv=nutrition_data.get("Iron (Daily Value)")
-        potassium_amount=nutrition_data.get("Potasium (Amount)")
-        potassium_dv=nutrition_data.get("Potasium (Daily Value)")
-
-        new_entry = Nutrition(
-            servings_size=servings_size,
-            servings_per_container=servings_per_container,
-            calories_per_serving=calories_per_serving,
-            total_fat_amount=total_fat_amount,
-            total_fat_dv=total_fat_dv,
-            saturated_fat_amount=saturated_fat_amount,
-            saturated_fat_dv=saturated_fat_dv,
-            trans_fat_amount=trans_fat_amount,
-            trans_fat_dv=trans_fat_dv,
-            cholesterol_amount=cholesterol_amount,
-            cholesterol_dv=cholesterol_dv,
-            sodium_amount=sodium_amount,
-            sodium_dv=sodium_dv,
-            total_carbohydrates_amount=total_carbohydrates_amount,
-            total_carbohydrates_dv=total_carbohydrates_dv,
-            dietary_fiber_amount=dietary_fiber_amount,
-            dietary_fiber_dv=dietary_fiber_dv,
-            total_sugars_amount=total_sugars_amount,
-            total_sugars_dv=total_sugars_dv,
-            added_sugars_amount=added_sugars_amount,
-            added_sugars_dv=added_sugars_dv,
-            protein_amount=protein_amount,
-            protein_dv=protein_dv,
-            vitamin_d_amount=vitamin_d_amount,
-            vitamin_d_dv=vitamin_d_dv,
-            calcium_amount=calcium_amount,
-            calcium_dv=calcium_dv,
-            iron_amount=iron_amount,
-            iron_dv=iron_dv,
-            potassium_amount=potassium_amount,
-            potassium_dv=potassium_dv
-        )
-        db.session.add(new_entry)
-        db.session.commit()
+        process = process_pdf if pdf else process_label
+        job_id = job_runner.submit(process, data, file.filename, content_hash, g.user_id, user_id=g.user_id)
+    except jobs.QueueFull:
+        metrics.UPLOADS_REJECTED.inc()
+        return jsonify({"message": "Too many uploads in progress, try again later"}), 503
 
-        return jsonify({"message": "File processed and data saved successfully"}), 200
-    except Exception as e:
-        logging.error(f"Error processing file: {e}")
-        return jsonify({"message": "Failed to process the file"}), 500
+    metrics.UPLOADS.inc()
+    return jsonify({"message": "File accepted for processing", "job_id": job_id}), 202
+
+@app.route('/api/food_labels_db/bulk', methods=['POST'])
+@login_required
+def upload_food_labels_bulk():
+    files = request.files.getlist('files')
+    if not files:
+        return jsonify({"message": "No files provided"}), 400
+
+    try:
+        with metrics.timed(None, 'receive'):
+            items = read_bulk_upload(files)
+    except (ValueError, zipfile.BadZipFile) as e:
+        return jsonify({"message": str(e)}), 400
+
+    if SAVE_UPLOADS:
+        for item in items:
+            if item['data'] is not None:
+                disk_writer.submit(store_blob, item['data'], item['sha256'])
+
+    try:
+        job_id = job_runner.submit(process_bulk, items, g.user_id, user_id=g.user_id)
+    except jobs.QueueFull:
+        metrics.UPLOADS_REJECTED.inc(len(items))
+        return jsonify({"message": "Too many uploads in progress, try again later"}), 503
+
+    metrics.UPLOADS.inc(len(items))
+    return jsonify({"message": "Files accepted for processing", "job_id": job_id, "files": len(items)}), 202
+
+def export_rows(columns, export_format, user_id=None):
+    """Nutrition rows in id order, fetched EXPORT_CHUNK_SIZE at a time and encoded chunk by chunk"""
+    import export
+    query = db.session.query(*[getattr(Nutrition, c) for c in columns]).order_by(Nutrition.id).execution_options(replica=True)
+    if user_id is not None:
+        query = query.filter(Nutrition.user_id == user_id)
+    table_columns = [Nutrition.__table__.c[c] for c in columns]
+    return export.export_chunks(stream_query(query, EXPORT_CHUNK_SIZE), table_columns, export_format,
+                                EXPORT_CHUNK_SIZE, EXPORT_ROW_GROUP_SIZE)
+
+@app.route('/api/food_labels_db/export', methods=['GET'])
+@login_required
+def export_food_labels():
+    """the caller's rows as Parquet (format=parquet, default) or an Arrow IPC stream (format=arrow)"""
+    import export
+    export_format = request.args.get('format', 'parquet')
+    if export_format not in export.EXPORT_FORMATS:
+        return jsonify({"message": f"Unknown format: {export_format}"}), 400
+    fields = [f for f in request.args.get('fields', '').split(',') if f] or EXPORT_COLUMNS
+    unknown = set(fields) - set(EXPORT_COLUMNS)
+    if unknown:
+        return jsonify({"message": f"Unknown fields: {', '.join(sorted(unknown))}"}), 400
+    columns = ['id'] + [f for f in fields if f != 'id']
+
+    mimetype, extension = export.EXPORT_FORMATS[export_format]
+    body = stream_with_context(export_rows(columns, export_format, g.user_id))
+    return Response(body, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="nutrition{extension}"'
+    }), 200
+
+@app.cli.command('export-nutrition')
+@click.argument('path')
+@click.option('--format', 'export_format', type=click.Choice(['parquet', 'arrow']),
+              help="defaults to arrow for .arrow/.arrows paths and parquet otherwise")
+@click.option('--user-id', type=int, help="only export this user's rows")
+def export_nutrition_command(path, export_format, user_id):
+    """Write the Nutrition table to a Parquet file or an Arrow IPC stream at PATH."""
+    export_format = export_format or ('arrow' if path.endswith(('.arrow', '.arrows')) else 'parquet')
+    size = 0
+    with open(path, 'wb') as f:
+        for data in export_rows(EXPORT_COLUMNS, export_format, user_id):
+            f.write(data)
+            size += len(data)
+    click.echo(f"Exported the nutrition table to {path} ({size / 1e6:.1f} MB)")
+
+@app.cli.command('assign-orphans')
+@click.option('--user-id', type=int, required=True, help="user who gets the rows without an owner")
+@click.option('--dry-run', is_flag=True, help="count the rows without assigning them")
+def assign_orphans_command(user_id, dry_run):
+    """Give the rows created before uploads had an owner to one user, so they show up in the listing again."""
+    if db.session.get(User, user_id) is None:
+        raise click.ClickException(f"No user with id {user_id}")
+    orphans = Nutrition.query.filter(Nutrition.user_id.is_(None))
+    if dry_run:
+        click.echo(f"Would assign {orphans.count()} rows to user {user_id}")
+        return
+    count = orphans.update({Nutrition.user_id: user_id}, synchronize_session=False)
+    db.session.commit()
+    click.echo(f"Assigned {count} rows to user {user_id}")
+
+def raw_row_batches(columns, batch_size, user_id=None):
+    """rows with stored raw OCR output, as (id, ocr_raw, *columns), in id order batch_size at a time
+
+    Each batch is its own keyset query, so no cursor stays open while the
+    caller writes between batches.
+    """
+    last_id = 0
+    while True:
+        query = db.session.query(Nutrition.id, Nutrition.ocr_raw, *[getattr(Nutrition, c) for c in columns]) \
+            .filter(Nutrition.id > last_id, Nutrition.ocr_raw.isnot(None))
+        if user_id is not None:
+            query = query.filter(Nutrition.user_id == user_id)
+        rows = query.order_by(Nutrition.id).limit(batch_size).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+@app.cli.command('reparse')
+@click.option('--workers', default=os.cpu_count() or 1, help="parser processes")
+@click.option('--batch-size', default=500, help="rows per parser task and per update")
+@click.option('--user-id', type=int, help="only re-parse this user's rows")
+@click.option('--dry-run', is_flag=True, help="count the rows that would change without updating them")
+def reparse_command(workers, batch_size, user_id, dry_run):
+    """Run the current parser on the stored raw OCR output and update the rows whose values change."""
+    import ocr
+    start = time.perf_counter()
+    pending = {}
+    counts = {'rows': 0, 'changed': 0}
+
+    def apply(done):
+        updates = []
+        for future in done:
+            current = pending.pop(future)
+            for nutrition_id, nutrition in future.result():
+                values = nutrition_values(nutrition)
+                # numeric columns follow from the strings, and FLOAT columns do not round-trip exactly
+                if any(values[column] != current[nutrition_id][column] for column in NUTRITION_FIELDS):
+                    updates.append({'id': nutrition_id, **values})
+        counts['changed'] += len(updates)
+        if updates and not dry_run:
+            db.session.execute(update(Nutrition), updates)
+            db.session.commit()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for rows in raw_row_batches(NUTRITION_FIELDS, batch_size, user_id):
+            # at most two batches per worker in flight, so memory does not grow with the table
+            if len(pending) >= workers * 2:
+                apply(wait(pending, return_when=FIRST_COMPLETED).done)
+            current = {row.id: {column: getattr(row, column) for column in NUTRITION_FIELDS} for row in rows}
+            pending[executor.submit(ocr.reparse_packed, [(row.id, row.ocr_raw) for row in rows])] = current
+            counts['rows'] += len(rows)
+        apply(wait(pending).done)
+
+    elapsed = time.perf_counter() - start
+    click.echo(f"{'Would update' if dry_run else 'Updated'} {counts['changed']} of {counts['rows']} rows "
+               f"in {elapsed:.1f} s ({counts['rows'] / max(elapsed, 1e-9):.0f} rows/s)")
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@login_required
+def get_job(job_id):
+    job = job_runner.get(job_id)
+    # someone else's job is reported like an unknown one
+    if job is None or job.get('user_id') != g.user_id:
+        return jsonify({"message": "Job not found"}), 404
+
+    return jsonify({
+        "id": job['id'],
+        "status": job['status'],
+        "error": job['error'],
+        "timings_ms": {stage: round(seconds * 1000, 1) for stage, seconds in job['timings'].items()},
+        **job['result']
+    }), 200
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(label_cache.stats()), 200
+
+@app.route('/api/food_labels_db/<int:nutrition_id>/<kind>', methods=['GET'])
+@login_required
+def get_food_label_image(nutrition_id, kind):
+    if kind not in ('upload', 'crop'):
+        return jsonify({"message": "Unknown image kind"}), 404
+    entry = db.session.get(Nutrition, nutrition_id)
+    if entry is None or entry.user_id != g.user_id:
+        return jsonify({"message": "Not found"}), 404
+
+    key = entry.upload_sha256 if kind == 'upload' else entry.crop_sha256
+    if not key or not blob_store.exists(key):
+        return jsonify({"message": "Image is not stored or has expired"}), 404
+    mimetype = 'image/jpeg' if kind == 'crop' else 'application/octet-stream'
+    return send_file(os.path.abspath(blob_store.path(key)), mimetype=mimetype, etag=key, max_age=86400)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4'), 200
+
+def warm_up():
+    """import the pipeline and load the OCR engines and label detector now rather than on the first upload"""
+    import label_detection
+    import ocr
+    ocr.warm_up()
+    label_detection.get_detector()
+
+def preload():
+    """import the pipeline and its model libraries without building any predictor or session
+
+    Nothing it loads holds threads or native sessions, so the process can
+    fork afterwards; every child then calls warm_up() itself.
+    """
+    import label_detection
+    import ocr
+    import paddleocr
+    if label_detection.LABEL_DETECTOR == 'onnx':
+        import onnxruntime
+
+@app.cli.command('warm-up')
+def warm_up_command():
+    """Load the OCR engines and label detector, downloading their models if needed."""
+    start = time.perf_counter()
+    warm_up()
+    click.echo(f"Loaded the OCR engines and label detector in {time.perf_counter() - start:.1f} s")
+
+def import_report(module):
+    """(wall seconds, import seconds per top-level package) of importing module in a fresh interpreter"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise click.ClickException(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    packages = defaultdict(float)
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        # each module's own time, so nothing is counted twice
+        packages[name.strip().split('.')[0]] += int(self_us) / 1e6
+    return wall, dict(packages)
+
+@app.cli.command('startup-report')
+@click.option('--module', default='app', help="module to import, app by default")
+@click.option('--limit', default=15, help="number of packages to list")
+@click.option('--json', 'as_json', is_flag=True, help="print every package as JSON, e.g. to keep a history")
+def startup_report_command(module, limit, as_json):
+    """Import a module with -X importtime and report where the startup time goes."""
+    wall, packages = import_report(module)
+    total = sum(packages.values())
+    if as_json:
+        click.echo(json.dumps({'module': module, 'wall_seconds': round(wall, 4), 'import_seconds': round(total, 4),
+                               'packages': {name: round(seconds, 4) for name, seconds in
+                                            sorted(packages.items(), key=lambda item: -item[1])}}))
+        return
+
+    click.echo(f"import {module}: {wall:.2f} s wall (including interpreter start), {total:.2f} s in imports")
+    for name, seconds in sorted(packages.items(), key=lambda item: -item[1])[:limit]:
+        click.echo(f"  {name:<24} {seconds * 1000:8.1f} ms  {seconds / total:6.1%}")
 
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+    warm_up()
+    blob_store.start_sweeper(STORAGE_SWEEP_INTERVAL)
+    label_cache.start_sweeper(STORAGE_SWEEP_INTERVAL)
     app.run(debug=True, port=5000)
 
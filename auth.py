@@ -0,0 +1,64 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+class TokenAuth:
+    """signed, expiring API tokens carrying a user id
+
+    Tokens are checked with an HMAC and their timestamp, without touching
+    the database. Verified tokens are kept in a small LRU until they
+    expire, so repeated requests with the same token skip even that.
+    """
+
+    def __init__(self, secret_key, max_age=43200, cache_size=1024):
+        self.serializer = URLSafeTimedSerializer(secret_key, salt='api-token')
+        self.max_age = max_age
+        self.cache_size = cache_size
+        self._verified = OrderedDict()
+        self._lock = threading.Lock()
+
+    def issue(self, user_id):
+        return self.serializer.dumps({'user_id': user_id})
+
+    def verify(self, token):
+        """user id the token was issued for, or None if it is invalid or expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._verified.get(token)
+            if entry is not None:
+                user_id, expires_at = entry
+                if now < expires_at:
+                    self._verified.move_to_end(token)
+                    return user_id
+                del self._verified[token]
+
+        try:
+            payload, issued_at = self.serializer.loads(token, max_age=self.max_age, return_timestamp=True)
+        except (BadSignature, SignatureExpired):
+            return None
+
+        user_id = payload.get('user_id')
+        with self._lock:
+            self._verified[token] = (user_id, issued_at.timestamp() + self.max_age)
+            while len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
+        return user_id
+
+class PasswordHasher:
+    """bcrypt hashing and checks on a dedicated, bounded thread pool
+
+    bcrypt is deliberately slow; capping the threads that run it keeps a
+    burst of logins from taking every core away from OCR.
+    """
+
+    def __init__(self, bcrypt, workers=2):
+        self.bcrypt = bcrypt
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+
+    def hash(self, password):
+        return self._executor.submit(self.bcrypt.generate_password_hash, password).result().decode('utf-8')
+
+    def check(self, password_hash, password):
+        return self._executor.submit(self.bcrypt.check_password_hash, password_hash, password).result()
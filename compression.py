@@ -0,0 +1,34 @@
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def available_encodings():
+    """content codings this server can produce, best first"""
+    return (['br'] if brotli is not None else []) + ['gzip']
+
+def negotiate(accept_encodings):
+    """best coding in a request's Accept-Encoding, or None to send the body as is"""
+    for encoding in available_encodings():
+        if accept_encodings[encoding]:
+            return encoding
+    return None
+
+def _compressor(encoding, level):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=level)
+        return compressor.process, compressor.finish
+    # wbits=31 writes a gzip header and trailer
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress, compressor.flush
+
+def compress_stream(chunks, encoding, level=5):
+    """compress an iterable of str or bytes chunks incrementally, yielding bytes"""
+    compress, finish = _compressor(encoding, level)
+    for chunk in chunks:
+        data = compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield finish()
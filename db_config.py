@@ -0,0 +1,107 @@
+import os
+import time
+import sqlalchemy as sa
+from sqlalchemy.pool import QueuePool
+from flask_sqlalchemy.session import Session
+import metrics
+
+# applied to every new SQLite connection
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',       # readers never block the writer, and the writer never blocks readers
+    'synchronous': 'NORMAL',     # with WAL, fsync only at checkpoints; a crash can lose the last commits but not corrupt the file
+    'busy_timeout': 5000,        # ms to wait for the write lock instead of failing with "database is locked"
+    'foreign_keys': 'ON',
+    'cache_size': -65536,        # 64 MiB page cache per connection
+    'temp_store': 'MEMORY',
+    'mmap_size': 268435456,      # read the first 256 MiB of the file through mmap
+}
+
+_engines = {}
+
+def database_uri():
+    """DATABASE_URL if set, otherwise the MySQL database from DATABASE_USER/PASSWORD/HOST/NAME"""
+    url = os.getenv('DATABASE_URL')
+    if url:
+        return url
+    username = os.getenv('DATABASE_USER', 'default_user')
+    password = os.getenv('DATABASE_PASSWORD', 'default_password')
+    host = os.getenv('DATABASE_HOST', 'localhost')
+    database = os.getenv('DATABASE_NAME', 'default_db')
+    return f"mysql+pymysql://{username}:{password}@{host}/{database}"
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    bind_name = 'default'
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.DB_CHECKOUT_SECONDS.observe(time.perf_counter() - start, bind=self.bind_name)
+
+def timed_pool(bind_name):
+    return type('TimedQueuePool', (TimedQueuePool,), {'bind_name': bind_name})
+
+def engine_options(uri, bind_name='default'):
+    """create_engine keyword arguments for uri, with the pool settings from DB_POOL_*"""
+    url = sa.engine.make_url(uri)
+    pool = {
+        'poolclass': timed_pool(bind_name),
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 30)),
+    }
+    if url.get_backend_name() == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            # every connection would get its own empty database
+            return {}
+        return {**pool, 'connect_args': {'check_same_thread': False, 'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000}}
+    return {
+        **pool,
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', '1') == '1',
+    }
+
+def configure(app):
+    """set the database URI, engine options and, with DATABASE_REPLICA_URL, the replica bind on app"""
+    uri = database_uri()
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(uri)
+    replica = os.getenv('DATABASE_REPLICA_URL')
+    if replica:
+        app.config['SQLALCHEMY_BINDS'] = {'replica': {'url': replica, **engine_options(replica, 'replica')}}
+
+def _set_sqlite_pragmas(connection, record):
+    cursor = connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+def instrument(db):
+    """add SQLite pragmas and pool metrics to db's engines; call inside an app context"""
+    for key, engine in db.engines.items():
+        name = key or 'default'
+        if engine.dialect.name == 'sqlite':
+            sa.event.listen(engine, 'connect', _set_sqlite_pragmas)
+        _engines[name] = engine
+
+def _checked_out():
+    return {(name,): engine.pool.checkedout() for name, engine in _engines.items() if hasattr(engine.pool, 'checkedout')}
+
+DB_CONNECTIONS_IN_USE = metrics.Gauge('label_db_pool_checked_out', "Connections currently checked out of each pool.", ['bind'])
+DB_CONNECTIONS_IN_USE.set_function(_checked_out)
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that sends reads marked with execution_options(replica=True) to the replica bind
+
+    Without a replica bind they run on the primary like any other query.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and clause is not None and clause.get_execution_options().get('replica'):
+            replica = self._db.engines.get('replica')
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
@@ -0,0 +1,105 @@
+import io
+import pyarrow as pa
+import pyarrow.parquet as pq
+import sqlalchemy as sa
+
+EXPORT_FORMATS = {
+    'parquet': ('application/vnd.apache.parquet', '.parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', '.arrows'),
+}
+
+def arrow_type(column):
+    """Arrow type for a SQLAlchemy column, so numbers stay numbers in the export"""
+    if isinstance(column.type, sa.Integer):
+        return pa.int64()
+    if isinstance(column.type, sa.Float):
+        return pa.float64()
+    if isinstance(column.type, sa.DateTime):
+        return pa.timestamp('us')
+    return pa.string()
+
+def arrow_schema(columns):
+    return pa.schema([pa.field(column.name, arrow_type(column)) for column in columns])
+
+def record_batches(rows, schema, chunk_size=10_000):
+    """turn an iterable of row tuples into record batches of chunk_size rows"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield _record_batch(chunk, schema)
+            chunk = []
+    if chunk:
+        yield _record_batch(chunk, schema)
+
+def _record_batch(chunk, schema):
+    columns = zip(*chunk)
+    return pa.RecordBatch.from_arrays([pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema)
+
+class ChunkSink(io.RawIOBase):
+    """write-only file that hands written bytes out through take(), for streaming a writer's output"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def row_groups(batches, schema, row_group_size):
+    """gather batches into tables of at least row_group_size rows (the last one may be smaller)"""
+    pending, rows = [], 0
+    for batch in batches:
+        pending.append(batch)
+        rows += batch.num_rows
+        if rows >= row_group_size:
+            yield pa.Table.from_batches(pending, schema)
+            pending, rows = [], 0
+    if pending:
+        yield pa.Table.from_batches(pending, schema)
+
+def parquet_chunks(batches, schema, row_group_size=100_000):
+    """Parquet file bytes, yielded after every row group
+
+    zstd compressed, with min/max statistics per column and row group so
+    readers can fetch only the columns they need and skip groups whose
+    range does not match their filter.
+    """
+    sink = ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression='zstd', write_statistics=True) as writer:
+        for table in row_groups(batches, schema, row_group_size):
+            writer.write_table(table, row_group_size=table.num_rows)
+            yield sink.take()
+    yield sink.take()
+
+def arrow_stream_chunks(batches, schema):
+    """Arrow IPC stream bytes, yielded after every record batch"""
+    sink = ChunkSink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            yield sink.take()
+    yield sink.take()
+
+def export_chunks(rows, columns, export_format, chunk_size=10_000, row_group_size=100_000):
+    """stream rows of the given SQLAlchemy columns as Parquet or an Arrow IPC stream"""
+    schema = arrow_schema(columns)
+    batches = record_batches(rows, schema, chunk_size)
+    if export_format == 'parquet':
+        return parquet_chunks(batches, schema, row_group_size)
+    if export_format == 'arrow':
+        return arrow_stream_chunks(batches, schema)
+    raise ValueError(f"Unknown export format: {export_format}")
@@ -0,0 +1,207 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+import metrics
+from metrics import timed
+
+HOST = socket.gethostname()
+UNFINISHED = ('queued', 'running')
+
+class QueueFull(Exception):
+    """raised when every job slot is taken"""
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class JobRunner:
+    """run pipeline jobs on a bounded background executor and keep their status
+
+    With a directory, every status change is also written to one JSON file
+    per job, so any worker process can answer for jobs run by another. The
+    file records the pid and host of the process running the job, which
+    touches it every heartbeat seconds until the job is done. An unfinished
+    job whose process is gone, or whose file has not been touched for
+    3 heartbeats, is reported as failed. Files untouched for max_age seconds
+    are deleted.
+    """
+
+    def __init__(self, max_workers=2, max_pending=16, max_history=1000, directory=None,
+                 heartbeat=10, max_age=86400):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._jobs = OrderedDict()
+        self._futures = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.max_history = max_history
+        self.directory = directory
+        self.heartbeat = heartbeat
+        self.max_age = max_age
+        self._keeper_pid = None
+
+    def _path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def _publish(self, job):
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(job['id'])
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(job, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logging.error(f"Failed to write the status of job {job['id']}: {e}")
+
+    def _forget(self, job_id):
+        if not self.directory:
+            return
+        try:
+            os.remove(self._path(job_id))
+        except OSError:
+            pass
+
+    def _start_keeper(self):
+        """start the heartbeat thread of this process; a forked worker does not inherit its parent's"""
+        if not self.directory or self._keeper_pid == os.getpid():
+            return
+        self._keeper_pid = os.getpid()
+        threading.Thread(target=self._keep, name='job-heartbeat', daemon=True).start()
+
+    def _keep(self):
+        last_sweep = 0
+        while True:
+            time.sleep(self.heartbeat)
+            with self._lock:
+                active = [job_id for job_id, job in self._jobs.items() if job['status'] in UNFINISHED]
+            for job_id in active:
+                try:
+                    os.utime(self._path(job_id))
+                except OSError:
+                    pass
+            if time.monotonic() - last_sweep > min(self.max_age, 3600):
+                last_sweep = time.monotonic()
+                try:
+                    self.sweep()
+                except Exception as e:
+                    logging.error(f"Job status sweep failed: {e}")
+
+    def sweep(self, now=None):
+        """delete status and temp files untouched for max_age seconds; returns the count removed"""
+        now = now or time.time()
+        removed = 0
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            try:
+                if now - entry.stat().st_mtime > self.max_age:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def _stale(self, job, mtime):
+        """whether an unfinished job read from its file will never finish"""
+        if job['status'] not in UNFINISHED:
+            return False
+        if job.get('host') == HOST and job.get('pid') and not pid_alive(job['pid']):
+            return True
+        return time.time() - mtime > 3 * self.heartbeat
+
+    def submit(self, fn, *args, user_id=None):
+        """queue fn(timings, *args) for user_id and return the new job id
+
+        fn returns a dict that is merged into the job status once it is done.
+        """
+        if self._closed or not self._slots.acquire(blocking=False):
+            raise QueueFull()
+        self._start_keeper()
+        job = {
+            'id': uuid.uuid4().hex,
+            'user_id': user_id,
+            'pid': os.getpid(),
+            'host': HOST,
+            'status': 'queued',
+            'timings': {},
+            'result': {},
+            'error': None
+        }
+        with self._lock:
+            self._jobs[job['id']] = job
+            while len(self._jobs) > self.max_history:
+                self._forget(self._jobs.popitem(last=False)[0])
+        self._publish(job)
+        metrics.JOBS_IN_FLIGHT.inc()
+        future = self._executor.submit(self._run, job, fn, args)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._done)
+        return job['id']
+
+    def _done(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+    def drain(self, timeout=None):
+        """stop taking jobs and wait up to timeout seconds for the queued and running ones
+
+        Returns whether they all finished. Jobs still unfinished when the
+        process exits are reported as failed by the other processes.
+        """
+        self._closed = True
+        with self._lock:
+            futures = list(self._futures)
+        done, pending = wait(futures, timeout)
+        return not pending
+
+    def _run(self, job, fn, args):
+        job['status'] = 'running'
+        self._publish(job)
+        try:
+            with timed(job['timings'], 'total'):
+                job['result'] = fn(job['timings'], *args) or {}
+            job['status'] = 'done'
+        except Exception as e:
+            logging.error(f"Job {job['id']} failed: {e}")
+            job['error'] = str(e)
+            job['status'] = 'failed'
+        finally:
+            self._publish(job)
+            metrics.JOBS_FINISHED.inc(status=job['status'])
+            metrics.JOBS_IN_FLIGHT.dec()
+            self._slots.release()
+
+    def get(self, job_id):
+        """snapshot of a job's status, or None if it is unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return {**job, 'timings': dict(job['timings'])}
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(os.path.basename(job_id))) as f:
+                job = json.load(f)
+                mtime = os.fstat(f.fileno()).st_mtime
+        except (OSError, ValueError):
+            return None
+        if self._stale(job, mtime):
+            job.update(status='failed', error="The server process running this job stopped before it finished")
+        return job
@@ -1,37 +1,278 @@
 # dataset link : https://universe.roboflow.com/lizazaza/nutrition-table
 
-from inference_sdk import InferenceHTTPClient
+import base64
+import importlib.util
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import cv2
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
 from PIL import Image
+import metrics
 
-def crop_label(image_path):
-    CLIENT = InferenceHTTPClient(
-        api_url="https://detect.roboflow.com",
-        api_key="AuX83b3TUkz1802QnozK"
-    )
+LABEL_DETECTOR = os.getenv('LABEL_DETECTOR', 'http')
+ROBOFLOW_API_URL = os.getenv('ROBOFLOW_API_URL', 'https://detect.roboflow.com')
+ROBOFLOW_API_KEY = os.getenv('ROBOFLOW_API_KEY', 'AuX83b3TUkz1802QnozK')
+DETECTOR_ONNX_PATH = os.getenv('DETECTOR_ONNX_PATH', 'models/nutrition-table.onnx')
+# long edge of the image sent to the detector; 0 sends full resolution
+DETECT_MAX_SIDE = int(os.getenv('DETECT_MAX_SIDE', 1280))
+# resolution PDF pages are rendered at, capped so a page's long edge stays within PDF_MAX_SIDE pixels
+PDF_DPI = int(os.getenv('PDF_DPI', 200))
+PDF_MAX_SIDE = int(os.getenv('PDF_MAX_SIDE', 4096))
+MODEL_ID = 'nutrition-table/2'
+
+class LabelDetector:
+    """finds nutrition tables in BGR images
+
+    detect() takes a list of images and returns, for each image, a list of
+    Roboflow-style predictions ({'x', 'y', 'width', 'height', 'confidence'},
+    box centre and size in pixels), best first.
+    """
+
+    def detect(self, images):
+        raise NotImplementedError
+
+class HTTPDetector(LabelDetector):
+    """Roboflow hosted inference over one persistent, connection-pooled session"""
+
+    def __init__(self, api_url=ROBOFLOW_API_URL, api_key=ROBOFLOW_API_KEY, model_id=MODEL_ID, max_connections=8, timeout=30):
+        self.url = f"{api_url}/{model_id}"
+        self.api_key = api_key
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix='detect')
+
+    def _detect_one(self, image):
+        ok, encoded = cv2.imencode('.jpg', image)
+        if not ok:
+            raise ValueError("Failed to encode the image for detection")
+        response = self.session.post(
+            self.url,
+            params={'api_key': self.api_key},
+            data=base64.b64encode(encoded.tobytes()),
+            headers={'Content-Type': 'application/x-www-form-urlencoded'},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        result = response.json()
+        logging.debug(f"Result from API: {result}")
+        return result.get('predictions', [])
+
+    def detect(self, images):
+        return list(self._executor.map(self._detect_one, images))
+
+class ONNXDetector(LabelDetector):
+    """runs an ONNX export (YOLOv8 layout) of nutrition-table/2 locally on CPU"""
+
+    def __init__(self, model_path=DETECTOR_ONNX_PATH, input_size=640, confidence=0.4, iou=0.5, threads=None):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError("The onnx label detector needs onnxruntime: pip install onnxruntime")
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.dynamic_batch = not isinstance(model_input.shape[0], int)
+        self.input_size = input_size
+        self.confidence = confidence
+        self.iou = iou
+
+    def _letterbox(self, image):
+        """resize into a padded square input, returning the CHW blob and the scale used"""
+        height, width = image.shape[:2]
+        scale = min(self.input_size / height, self.input_size / width)
+        resized = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_LINEAR)
+        canvas = np.full((self.input_size, self.input_size, 3), 114, dtype=np.uint8)
+        canvas[:resized.shape[0], :resized.shape[1]] = resized
+        blob = canvas[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+        return blob, scale
+
+    def _predictions(self, output, scale):
+        """decode one (4 + classes, anchors) output with non-maximum suppression"""
+        output = output.T
+        scores = output[:, 4:].max(axis=1)
+        keep = scores >= self.confidence
+        boxes = output[keep, :4] / scale
+        scores = scores[keep]
+        top_left = np.column_stack([boxes[:, 0] - boxes[:, 2] / 2, boxes[:, 1] - boxes[:, 3] / 2, boxes[:, 2], boxes[:, 3]])
+        indices = cv2.dnn.NMSBoxes(top_left.tolist(), scores.tolist(), self.confidence, self.iou)
+        indices = sorted(np.array(indices).flatten(), key=lambda i: -scores[i])
+        return [{
+            'x': float(boxes[i, 0]),
+            'y': float(boxes[i, 1]),
+            'width': float(boxes[i, 2]),
+            'height': float(boxes[i, 3]),
+            'confidence': float(scores[i])
+        } for i in indices]
+
+    def detect(self, images):
+        if not images:
+            return []
+        blobs, scales = zip(*(self._letterbox(image) for image in images))
+        if self.dynamic_batch:
+            outputs = self.session.run(None, {self.input_name: np.stack(blobs)})[0]
+        else:
+            outputs = np.concatenate([self.session.run(None, {self.input_name: blob[None]})[0] for blob in blobs])
+        return [self._predictions(output, scale) for output, scale in zip(outputs, scales)]
+
+class StubDetector(LabelDetector):
+    """returns fixed predictions without a model, by default the whole image"""
+
+    def __init__(self, predictions=None):
+        self.predictions = predictions
+
+    def detect(self, images):
+        results = []
+        for image in images:
+            if self.predictions is not None:
+                results.append(list(self.predictions))
+            else:
+                height, width = image.shape[:2]
+                results.append([{'x': width / 2, 'y': height / 2, 'width': width, 'height': height, 'confidence': 1.0}])
+        return results
+
+def create_detector(backend=LABEL_DETECTOR):
+    """build the detector backend named by LABEL_DETECTOR (http, onnx or stub)"""
+    if backend == 'http':
+        return HTTPDetector()
+    if backend == 'onnx':
+        return ONNXDetector()
+    if backend == 'stub':
+        return StubDetector()
+    raise ValueError(f"Unknown label detector backend: {backend}")
+
+_detector = None
+_detector_lock = threading.Lock()
 
-    result = CLIENT.infer(image_path, model_id="nutrition-table/2")
+def get_detector():
+    """process-wide detector, created on first use"""
+    global _detector
+    with _detector_lock:
+        if _detector is None:
+            _detector = create_detector()
+        return _detector
 
-    print("Result from API:", result)
+def prediction_box(pred):
+    """(x1, y1, x2, y2) corners of a centre/size prediction"""
+    x, y, width, height = pred['x'], pred['y'], pred['width'], pred['height']
 
-    image = cv2.imread(image_path)
+    x1 = int(x - width / 2)
+    y1 = int(y - height / 2)
+    x2 = int(x + width / 2)
+    y2 = int(y + height / 2)
+    return (x1, y1, x2, y2)
+
+def decode_image(data):
+    """decode uploaded bytes straight from memory into a BGR array, or None"""
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+def is_pdf(data):
+    return b'%PDF-' in data[:1024]
+
+def pdf_supported():
+    """whether PyMuPDF is installed, checked without importing it"""
+    return importlib.util.find_spec('pymupdf') is not None
+
+def pdf_pages(data, dpi=PDF_DPI, max_side=PDF_MAX_SIDE):
+    """render a PDF lazily, yielding (page_number, BGR array) one page at a time, numbered from 1"""
+    try:
+        import pymupdf
+    except ImportError:
+        raise ImportError("PDF uploads need PyMuPDF: pip install pymupdf")
+
+    try:
+        document = pymupdf.open(stream=data, filetype='pdf')
+    except Exception as e:
+        raise ValueError(f"The uploaded file is not a readable PDF: {e}")
+    with document:
+        if document.needs_pass:
+            raise ValueError("The uploaded PDF is password protected")
+        for number, page in enumerate(document, start=1):
+            zoom = dpi / 72
+            if max_side:
+                zoom = min(zoom, max_side / max(page.rect.width, page.rect.height))
+            pixmap = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), colorspace=pymupdf.csRGB, alpha=False)
+            rows = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(pixmap.height, pixmap.stride)
+            rgb = rows[:, :pixmap.width * 3].reshape(pixmap.height, pixmap.width, 3)
+            yield number, cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+
+def encode_image(image, ext='.png'):
+    """encode a BGR array (or view) into image file bytes"""
+    ok, encoded = cv2.imencode(ext, image)
+    if not ok:
+        raise ValueError(f"Failed to encode the image as {ext}")
+    return encoded.tobytes()
+
+def downscale(image, max_side):
+    """(image, scale) with the long edge shrunk to max_side; small images are returned as is with scale 1"""
+    height, width = image.shape[:2]
+    if not max_side or max(height, width) <= max_side:
+        return image, 1.0
+    scale = max_side / max(height, width)
+    resized = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    return resized, scale
+
+def scale_box(box, factor):
+    x1, y1, x2, y2 = box
+    return (int(x1 * factor), int(y1 * factor), int(round(x2 * factor)), int(round(y2 * factor)))
+
+def crop_array(image, box):
+    """crop as a NumPy view of image, clamping the box to the image bounds"""
+    height, width = image.shape[:2]
+    x1, y1, x2, y2 = box
+    return image[max(y1, 0):min(y2, height), max(x1, 0):min(x2, width)]
+
+def crop_labels(images, detector=None, timings=None, max_side=DETECT_MAX_SIDE):
+    """detect and crop a batch of BGR images, returning (crop_view, box) or (None, None) per image
+
+    Detection runs on copies whose long edge is at most max_side; the boxes
+    are mapped back so the crop is a full-resolution view of the original.
+    """
+    detector = detector or get_detector()
+    with metrics.timed(timings, 'preprocess'):
+        small, scales = zip(*(downscale(image, max_side) for image in images)) if images else ((), ())
+    for image, resized in zip(images, small):
+        metrics.IMAGE_MEGAPIXELS.observe(image.shape[0] * image.shape[1] / 1e6, stage='upload')
+        metrics.IMAGE_MEGAPIXELS.observe(resized.shape[0] * resized.shape[1] / 1e6, stage='detection')
+
+    with metrics.timed(timings, 'detect_model'):
+        batch_predictions = detector.detect(list(small))
+
+    results = []
+    for image, scale, predictions in zip(images, scales, batch_predictions):
+        if not predictions:
+            logging.warning("No predictions found in the result.")
+            metrics.NO_DETECTION.inc()
+            results.append((None, None))
+            continue
+
+        box = scale_box(prediction_box(predictions[0]), 1 / scale)
+        results.append((crop_array(image, box), box))
+    return results
+
+def crop_label(image_path):
+    cropped_image, _ = crop_label_with_box(image_path)
+    return cropped_image
+
+def crop_label_with_box(image_path, detector=None, timings=None):
+    """crop the nutrition table, returning (cropped_image, (x1, y1, x2, y2)) or (None, None)"""
+    with metrics.timed(timings, 'imread'):
+        image = cv2.imread(image_path)
     if image is None:
-        print("Failed to load the input image. Check the path.")
-        exit(1)
-
-    if 'predictions' in result and len(result['predictions']) > 0:
-        for pred in result['predictions']:
-            x, y, width, height = pred['x'], pred['y'], pred['width'], pred['height']
-
-            x1 = int(x - width / 2)
-            y1 = int(y - height / 2)
-            x2 = int(x + width / 2)
-            y2 = int(y + height / 2)
-
-            image_pil = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-            box = (x1, y1, x2, y2)
-            cropped_image = image_pil.crop(box)
-            return cropped_image
-    else:
-        print("No predictions found in the result.")
-        return None
+        logging.error(f"Failed to load the input image: {image_path}")
+        return None, None
+
+    cropped, box = crop_labels([image], detector, timings)[0]
+    if cropped is None:
+        return None, None
+    return Image.fromarray(cv2.cvtColor(cropped, cv2.COLOR_BGR2RGB)), box
@@ -0,0 +1,170 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# seconds, from a cached upload up to a slow OCR run
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+def _format_value(value):
+    if isinstance(value, int):
+        return str(value)
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+class Metric:
+    """a named metric with optional labels, rendered in the Prometheus text format"""
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # an unlabelled series is reported as 0 before its first update
+        self._values = {} if self.labelnames else {(): 0}
+        self._function = None
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def set_function(self, function):
+        """read the value from function() at render time
+
+        function returns a number, or for a labelled metric a dict from
+        label value tuples to numbers.
+        """
+        self._function = function
+
+    def _snapshot(self):
+        if self._function is not None:
+            values = self._function()
+            return values if self.labelnames else {(): values}
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        """(name, label pairs, value) for every series"""
+        for key, value in sorted(self._snapshot().items()):
+            yield self.name, list(zip(self.labelnames, key)), value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines)
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(Metric):
+    """bucketed observations; buckets are upper bounds, +Inf is added when rendering"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # one slot per bucket plus +Inf, then the sum
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def _snapshot(self):
+        with self._lock:
+            return {key: list(counts) for key, counts in self._values.items()}
+
+    def samples(self):
+        for key, counts in sorted(self._snapshot().items()):
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", labels + [('le', _format_value(bound))], cumulative
+            yield f"{self.name}_sum", labels, counts[-1]
+            yield f"{self.name}_count", labels, cumulative
+
+def render():
+    """every registered metric in the Prometheus text exposition format"""
+    with _registry_lock:
+        registered = list(_registry)
+    return '\n'.join(metric.render() for metric in registered) + '\n'
+
+STAGE_SECONDS = Histogram('label_pipeline_stage_seconds', "Time spent in each stage of label processing.", ['stage'])
+UPLOADS = Counter('label_uploads_total', "Label images accepted for processing.")
+UPLOADS_REJECTED = Counter('label_uploads_rejected_total', "Uploads refused because the job queue was full.")
+JOBS_FINISHED = Counter('label_jobs_finished_total', "Finished jobs by status.", ['status'])
+JOBS_IN_FLIGHT = Gauge('label_jobs_in_flight', "Jobs queued or running.")
+IMAGE_MEGAPIXELS = Histogram('label_image_megapixels', "Image size at each point of the pipeline.", ['stage'],
+                             buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 12.0, 16.0, 24.0, 48.0))
+OCR_LABELS = Counter('label_ocr_total', "Labels read by each OCR tier.", ['tier'])
+OCR_ESCALATIONS = Counter('label_ocr_escalations_total', "Fast OCR results rerun on the accurate tier.")
+NO_DETECTION = Counter('label_no_detection_total', "Images in which no nutrition table was detected.")
+DB_CHECKOUT_SECONDS = Histogram('label_db_pool_checkout_seconds', "Time spent waiting for a pooled database connection.", ['bind'],
+                                buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0))
+STORAGE_WRITTEN = Counter('label_storage_written_total', "Blobs written to the content store.")
+STORAGE_DEDUPLICATED = Counter('label_storage_deduplicated_total', "Stores skipped because the content was already present.")
+STORAGE_EVICTED = Counter('label_storage_evicted_total', "Blobs removed by the retention sweep.")
+STORAGE_BYTES = Gauge('label_storage_bytes', "Bytes held by the content store at the last sweep.")
+STORAGE_BLOBS = Gauge('label_storage_blobs', "Blobs held by the content store at the last sweep.")
+
+@contextmanager
+def timed(timings, stage):
+    """time the block into the stage histogram and, unless timings is None, into timings[stage]
+
+    Repeated stages within one job add up in timings.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
@@ -0,0 +1,48 @@
+"""initial schema, as created by query.sql
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+NUTRITION_COLUMNS = [
+    'servings_size', 'servings_per_container', 'calories_per_serving',
+    'total_fat_amount', 'total_fat_dv', 'saturated_fat_amount',
+    'saturated_fat_dv', 'trans_fat_amount', 'trans_fat_dv',
+    'cholesterol_amount', 'cholesterol_dv', 'sodium_amount',
+    'sodium_dv', 'total_carbohydrates_amount', 'total_carbohydrates_dv',
+    'dietary_fiber_amount', 'dietary_fiber_dv', 'total_sugars_amount',
+    'total_sugars_dv', 'added_sugars_amount', 'added_sugars_dv',
+    'protein_amount', 'protein_dv', 'vitamin_d_amount', 'vitamin_d_dv',
+    'calcium_amount', 'calcium_dv', 'iron_amount', 'iron_dv',
+    'potassium_amount', 'potassium_dv'
+]
+
+
+def upgrade():
+    op.create_table(
+        'user',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('email', sa.String(length=100), nullable=False, unique=True),
+        sa.Column('password_hash', sa.String(length=200), nullable=False)
+    )
+    op.create_table(
+        'nutrition',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        *[sa.Column(name, sa.String(length=100)) for name in NUTRITION_COLUMNS]
+    )
+
+
+def downgrade():
+    op.drop_table('nutrition')
+    op.drop_table('user')
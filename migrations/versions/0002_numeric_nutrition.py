@@ -0,0 +1,67 @@
+"""numeric nutrition columns in canonical units, backfilled from the strings
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+import units
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+INDEXED_COLUMNS = [
+    'calories_kcal', 'total_fat_g', 'saturated_fat_g', 'sodium_mg',
+    'total_sugars_g', 'added_sugars_g', 'protein_g'
+]
+
+SOURCE_COLUMNS = list(units.AMOUNT_COLUMNS) + list(units.PERCENT_COLUMNS) + list(units.COUNT_COLUMNS)
+
+BACKFILL_CHUNK_SIZE = 1000
+
+
+def upgrade():
+    with op.batch_alter_table('nutrition') as batch_op:
+        for name in units.NUMERIC_COLUMNS:
+            batch_op.add_column(sa.Column(name, sa.Float(), nullable=True))
+
+    nutrition = sa.table(
+        'nutrition',
+        sa.column('id', sa.Integer),
+        *[sa.column(name, sa.String) for name in SOURCE_COLUMNS],
+        *[sa.column(name, sa.Float) for name in units.NUMERIC_COLUMNS]
+    )
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(nutrition.c.id, *[nutrition.c[name] for name in SOURCE_COLUMNS])
+            .where(nutrition.c.id > last_id)
+            .order_by(nutrition.c.id)
+            .limit(BACKFILL_CHUNK_SIZE)
+        ).mappings().all()
+        if not rows:
+            break
+        bind.execute(
+            nutrition.update().where(nutrition.c.id == sa.bindparam('row_id')),
+            [{'row_id': row['id'], **units.numeric_values(row)} for row in rows]
+        )
+        last_id = rows[-1]['id']
+
+    for name in INDEXED_COLUMNS:
+        op.create_index(f'ix_nutrition_{name}', 'nutrition', [name])
+
+
+def downgrade():
+    for name in INDEXED_COLUMNS:
+        op.drop_index(f'ix_nutrition_{name}', table_name='nutrition')
+    with op.batch_alter_table('nutrition') as batch_op:
+        for name in units.NUMERIC_COLUMNS:
+            batch_op.drop_column(name)
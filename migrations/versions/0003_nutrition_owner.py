@@ -0,0 +1,30 @@
+"""owner of each nutrition row, indexed together with id
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('nutrition') as batch_op:
+        batch_op.add_column(sa.Column('user_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_nutrition_user_id_user', 'user', ['user_id'], ['id'])
+    op.create_index('ix_nutrition_user_id_id', 'nutrition', ['user_id', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_nutrition_user_id_id', table_name='nutrition')
+    with op.batch_alter_table('nutrition') as batch_op:
+        batch_op.drop_constraint('fk_nutrition_user_id_user', type_='foreignkey')
+        batch_op.drop_column('user_id')
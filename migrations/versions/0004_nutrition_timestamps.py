@@ -0,0 +1,38 @@
+"""creation and update times of nutrition rows
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def timestamp_column(name):
+    # existing rows get the migration time; MySQL needs the precision repeated in the default
+    if op.get_bind().dialect.name == 'mysql':
+        return sa.Column(name, mysql.DATETIME(fsp=6), nullable=False, server_default=sa.text('CURRENT_TIMESTAMP(6)'))
+    return sa.Column(name, sa.DateTime(), nullable=False, server_default=sa.func.now())
+
+
+def upgrade():
+    with op.batch_alter_table('nutrition') as batch_op:
+        batch_op.add_column(timestamp_column('created_at'))
+        batch_op.add_column(timestamp_column('updated_at'))
+    op.create_index('ix_nutrition_user_id_updated_at', 'nutrition', ['user_id', 'updated_at'])
+
+
+def downgrade():
+    op.drop_index('ix_nutrition_user_id_updated_at', table_name='nutrition')
+    with op.batch_alter_table('nutrition') as batch_op:
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('created_at')
@@ -0,0 +1,26 @@
+"""OCR tier that read each label
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('nutrition') as batch_op:
+        batch_op.add_column(sa.Column('ocr_tier', sa.String(length=16), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('nutrition') as batch_op:
+        batch_op.drop_column('ocr_tier')
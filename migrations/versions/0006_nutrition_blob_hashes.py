@@ -0,0 +1,30 @@
+"""content hashes of the stored upload and crop
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('nutrition') as batch_op:
+        batch_op.add_column(sa.Column('upload_sha256', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('crop_sha256', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_nutrition_upload_sha256', ['upload_sha256'])
+
+
+def downgrade():
+    with op.batch_alter_table('nutrition') as batch_op:
+        batch_op.drop_index('ix_nutrition_upload_sha256')
+        batch_op.drop_column('crop_sha256')
+        batch_op.drop_column('upload_sha256')
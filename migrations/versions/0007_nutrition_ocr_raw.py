@@ -0,0 +1,27 @@
+"""raw OCR output of each label
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('nutrition') as batch_op:
+        batch_op.add_column(sa.Column('ocr_raw', sa.LargeBinary().with_variant(mysql.MEDIUMBLOB(), 'mysql'), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('nutrition') as batch_op:
+        batch_op.drop_column('ocr_raw')
@@ -1,149 +1,466 @@
-from paddleocr import PaddleOCR
+import cv2
+import os
+import queue
 import re
+import struct
+import threading
+import zlib
+from collections import namedtuple
+from contextlib import contextmanager
+from itertools import chain
+from operator import itemgetter
 import numpy as np
 from rapidfuzz import fuzz, process
+import metrics
 
-def extract_nutrition_info(image):
-    """ocr on image"""
-    ocr = PaddleOCR(use_angle_cls=True, lang='en')
-    result = ocr.ocr(np.array(image), cls=True)
-
-    def extract_row_lines(ocr_output, y_threshold=10):
-        """extract info line by line"""
-        rows = []
-        current_row = []
-        row_center = None
-        for box in ocr_output:
-            top_left_y = box[0][0][1]
-            bottom_left_y = box[0][3][1]
-            cell_center_y = (top_left_y + bottom_left_y) / 2
-            if row_center is None:
-                row_center = cell_center_y
-            if abs(row_center - cell_center_y) > y_threshold:
-                if current_row:
-                    rows.append(current_row)
-                row_center = cell_center_y
-                current_row = [box[1][0]]
+OCR_POOL_SIZE = int(os.getenv('OCR_POOL_SIZE', 2))
+OCR_BATCH_PIXELS = int(os.getenv('OCR_BATCH_PIXELS', 16_000_000))
+DROP_SCORE = 0.5
+# long edge of label crops given to PaddleOCR; text detection works at 960
+# px and recognition at 48 px line height, so more pixels only cost time
+OCR_MAX_SIDE = int(os.getenv('OCR_MAX_SIDE', 1920))
+
+# auto runs the fast tier and escalates to the accurate one when needed; fast or accurate force a tier
+OCR_TIER = os.getenv('OCR_TIER', 'auto')
+OCR_FAST_POOL_SIZE = int(os.getenv('OCR_FAST_POOL_SIZE', OCR_POOL_SIZE))
+OCR_FAST_DET_SIDE = int(os.getenv('OCR_FAST_DET_SIDE', 640))
+OCR_FAST_REC_MODEL_DIR = os.getenv('OCR_FAST_REC_MODEL_DIR')
+OCR_ESCALATE_MAX_MISSING = int(os.getenv('OCR_ESCALATE_MAX_MISSING', 1))
+OCR_ESCALATE_MIN_CONFIDENCE = float(os.getenv('OCR_ESCALATE_MIN_CONFIDENCE', 0.85))
+
+class EnginePool:
+    """process-wide pool of preloaded PaddleOCR engines"""
+
+    def __init__(self, size=OCR_POOL_SIZE, **engine_kwargs):
+        self.size = size
+        self.engine_kwargs = engine_kwargs
+        self.use_angle_cls = engine_kwargs.get('use_angle_cls', False)
+        self._engines = queue.Queue()
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def warm_up(self):
+        """load every engine once, later calls return immediately"""
+        with self._lock:
+            if self._loaded:
+                return
+            # imported here so the parser can be used without paddle installed
+            from paddleocr import PaddleOCR
+            for _ in range(self.size):
+                self._engines.put(PaddleOCR(**self.engine_kwargs))
+            self._loaded = True
+
+    @contextmanager
+    def engine(self, timings=None):
+        """borrow an engine, recording the wait as the ocr_wait stage"""
+        self.warm_up()
+        with metrics.timed(timings, 'ocr_wait'):
+            engine = self._engines.get()
+        try:
+            yield engine
+        finally:
+            self._engines.put(engine)
+
+def fast_engine_kwargs():
+    kwargs = {'use_angle_cls': False, 'lang': 'en', 'det_limit_side_len': OCR_FAST_DET_SIDE}
+    if OCR_FAST_REC_MODEL_DIR:
+        kwargs['rec_model_dir'] = OCR_FAST_REC_MODEL_DIR
+    return kwargs
+
+# fast: no angle classifier, smaller detection input, optionally a lighter recognizer
+OCR_TIERS = {
+    'fast': EnginePool(OCR_FAST_POOL_SIZE, **fast_engine_kwargs()),
+    'accurate': EnginePool(use_angle_cls=True, lang='en'),
+}
+
+def warm_up(tier=OCR_TIER):
+    """load the engines the given tier setting can use"""
+    for name in (['fast', 'accurate'] if tier == 'auto' else [tier]):
+        OCR_TIERS[name].warm_up()
+
+def ocr_input(image, max_side=OCR_MAX_SIDE, timings=None):
+    """image as an array with its long edge at most max_side, without copying when it already fits"""
+    array = np.asarray(image)
+    height, width = array.shape[:2]
+    if max_side and max(height, width) > max_side:
+        with metrics.timed(timings, 'preprocess'):
+            scale = max_side / max(height, width)
+            array = cv2.resize(array, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    metrics.IMAGE_MEGAPIXELS.observe(array.shape[0] * array.shape[1] / 1e6, stage='ocr')
+    return array
+
+# present on every label, so missing ones mean the OCR went wrong rather than the label being short
+CORE_FIELDS = ["Calories", "Total Fat (Amount)", "Sodium (Amount)", "Total Carbohydrates (Amount)", "Protein (Amount)"]
+
+def needs_escalation(nutrition, boxes):
+    """whether a fast tier result misses too many core fields or was read with low confidence"""
+    missing = sum(nutrition.get(field) is None for field in CORE_FIELDS)
+    if missing > OCR_ESCALATE_MAX_MISSING:
+        return True
+    return len(boxes.confidences) == 0 or float(boxes.confidences.mean()) < OCR_ESCALATE_MIN_CONFIDENCE
+
+def recognize(array, tier, timings=None):
+    """PaddleOCR lines of array read with the given tier's engines, as OCRBoxes"""
+    pool = OCR_TIERS[tier]
+    with pool.engine(timings) as ocr:
+        with metrics.timed(timings, f'ocr_{tier}'):
+            result = ocr.ocr(array, cls=pool.use_angle_cls)
+    return ocr_boxes_to_array(result[0] or [])
+
+def parse_boxes(boxes, timings=None):
+    with metrics.timed(timings, 'parse'):
+        return parse_nutrition_info(boxes)
+
+def escalate(array, nutrition, boxes, timings=None):
+    """(nutrition, tier, boxes) for a fast tier result, rerun with the accurate tier if it falls short"""
+    if not needs_escalation(nutrition, boxes):
+        metrics.OCR_LABELS.inc(tier='fast')
+        return nutrition, 'fast', boxes
+    metrics.OCR_ESCALATIONS.inc()
+    metrics.OCR_LABELS.inc(tier='accurate')
+    boxes = recognize(array, 'accurate', timings)
+    return parse_boxes(boxes, timings), 'accurate', boxes
+
+def extract_nutrition(image, timings=None, tier=OCR_TIER):
+    """(nutrition info, tier that produced it, the OCRBoxes it was parsed from) for image
+
+    image is a PIL image, or a NumPy array/view which is used without
+    copying. With tier 'auto' the fast engines run first and the accurate
+    ones only when needs_escalation() finds the fast result lacking.
+    """
+    array = ocr_input(image, timings=timings)
+    if tier != 'auto':
+        metrics.OCR_LABELS.inc(tier=tier)
+        boxes = recognize(array, tier, timings)
+        return parse_boxes(boxes, timings), tier, boxes
+
+    boxes = recognize(array, 'fast', timings)
+    return escalate(array, parse_boxes(boxes, timings), boxes, timings)
+
+def extract_nutrition_info(image, timings=None):
+    """ocr on image (a PIL image, or a NumPy array/view which is used without copying)"""
+    return extract_nutrition(image, timings)[0]
+
+def crop_text_box(image, box):
+    """perspective crop of one detected text box, rotated upright if it is tall"""
+    points = np.array(box, dtype=np.float32)
+    width = int(max(np.linalg.norm(points[0] - points[1]), np.linalg.norm(points[2] - points[3])))
+    height = int(max(np.linalg.norm(points[0] - points[3]), np.linalg.norm(points[1] - points[2])))
+    target = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    matrix = cv2.getPerspectiveTransform(points, target)
+    crop = cv2.warpPerspective(image, matrix, (width, height), borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC)
+    if crop.shape[0] >= crop.shape[1] * 1.5:
+        crop = np.rot90(crop)
+    return crop
+
+def memory_batches(images, max_pixels):
+    """group images, sized by ocr_input, into batches holding at most max_pixels (and at least one image)"""
+    batch, pixels = [], 0
+    for image in images:
+        array = ocr_input(image)
+        size = array.shape[0] * array.shape[1]
+        if batch and pixels + size > max_pixels:
+            yield batch
+            batch, pixels = [], 0
+        batch.append(array)
+        pixels += size
+    if batch:
+        yield batch
+
+def extract_nutrition_batch(images, max_batch_pixels=OCR_BATCH_PIXELS, tier=OCR_TIER):
+    """ocr on many label crops, yielding (nutrition info, tier, OCRBoxes) per image in input order
+
+    Text boxes are detected image by image, then the text crops of a whole
+    batch go through the recognizer (and the angle classifier of the
+    accurate tier) in a single call. With tier 'auto' the batch runs on the
+    fast tier and only the images that need it are read again one by one.
+    """
+    batch_tier = 'fast' if tier == 'auto' else tier
+    pool = OCR_TIERS[batch_tier]
+    for batch in memory_batches(images, max_batch_pixels):
+        with pool.engine() as ocr, metrics.timed(None, f'ocr_{batch_tier}'):
+            boxes = [ocr.ocr(array, rec=False)[0] or [] for array in batch]
+            crops = [crop_text_box(array, box) for array, image_boxes in zip(batch, boxes) for box in image_boxes]
+            texts = ocr.ocr(crops, det=False, cls=pool.use_angle_cls)[0] if crops else []
+
+        offset = 0
+        for array, image_boxes in zip(batch, boxes):
+            image_texts = texts[offset:offset + len(image_boxes)]
+            offset += len(image_boxes)
+            ocr_boxes = ocr_boxes_to_array([[box, text] for box, text in zip(image_boxes, image_texts) if text[1] >= DROP_SCORE])
+            nutrition = parse_boxes(ocr_boxes)
+            if tier == 'auto':
+                yield escalate(array, nutrition, ocr_boxes)
             else:
-                current_row.append(box[1][0])
-        if current_row:
-            rows.append(current_row)
-        return rows
+                metrics.OCR_LABELS.inc(tier=tier)
+                yield nutrition, tier, ocr_boxes
 
-    ocr_output = result[0]
-    rows = extract_row_lines(ocr_output)
+def extract_nutrition_info_batch(images, max_batch_pixels=OCR_BATCH_PIXELS):
+    """ocr on many label crops, yielding one nutrition dict per image in input order"""
+    for nutrition, _, _ in extract_nutrition_batch(images, max_batch_pixels):
+        yield nutrition
 
-    def preprocess_text(text):
-        """lowercase and eliminate spaces"""
-        return re.sub(r"[^a-zA-Z0-9\s]", "", text.lower())
+OCRBoxes = namedtuple('OCRBoxes', ['corners', 'texts', 'confidences'])
 
-    section_keywords = {
-        "serving_info": ["Serving Size", "Servings per Container", "Servings per Package"],
-        "calorie_info": ["Calories"],
-        "nutrient_table": ["Total Fat", "Saturated Fat","Trans Fat", "Cholesterol", "Sodium", "Total Carbohydrates", "Dietary Fiber", "Total Sugars", "Added Sugars", "Protein", "Vitamin D", "Calcium", "Iron", "Potasium"]
-    }
+def ocr_boxes_to_array(ocr_output):
+    """PaddleOCR lines as compact arrays: corners (N, 4, 2), texts and confidences (N,)"""
+    if not ocr_output:
+        return OCRBoxes(np.zeros((0, 4, 2), dtype=np.float32), [], np.zeros(0, dtype=np.float32))
+    count = len(ocr_output)
+    points = chain.from_iterable(chain.from_iterable(map(itemgetter(0), ocr_output)))
+    corners = np.fromiter(points, dtype=np.float32, count=count * 8).reshape(count, 4, 2)
+    texts = [line[1][0] for line in ocr_output]
+    confidences = np.fromiter((line[1][1] for line in ocr_output), dtype=np.float32, count=count)
+    return OCRBoxes(corners, texts, confidences)
 
-    priority_order = ["nutrient_table", "calorie_info", "serving_info"]
+PACK_MAGIC = b'OCB1'
 
-    def extract_section_fuzzy(row, threshold=85):
-        """Detect section and categorize using fuzzy matching with priority resolution."""
-        row_text = preprocess_text(" ".join(row))
-        best_match = None
-        best_score = 0
-        detected_section = None
+def pack_boxes(boxes):
+    """OCRBoxes as zlib-compressed bytes, for keeping the raw OCR output of a label
 
-        for section in priority_order: 
-            """Use priority order to resolve overlaps""" 
-            for keyword in section_keywords[section]:
-                score = fuzz.partial_ratio(row_text, preprocess_text(keyword))
-                if score > best_score and score > threshold:
-                    best_match = row
-                    best_score = score
-                    detected_section = section 
+    Layout before compression: magic, line count n (uint32), then n*4*2
+    float32 corners, n float32 confidences, n uint32 text lengths and the
+    UTF-8 texts back to back, all little-endian.
+    """
+    texts = [text.encode('utf-8') for text in boxes.texts]
+    parts = [
+        PACK_MAGIC,
+        struct.pack('<I', len(texts)),
+        np.asarray(boxes.corners, dtype='<f4').tobytes(),
+        np.asarray(boxes.confidences, dtype='<f4').tobytes(),
+        np.array([len(text) for text in texts], dtype='<u4').tobytes(),
+    ] + texts
+    return zlib.compress(b''.join(parts), 6)
 
-        if best_match:
-            return (best_match, detected_section)
-        return None
+def unpack_boxes(data):
+    """OCRBoxes from pack_boxes() output"""
+    raw = zlib.decompress(data)
+    if raw[:4] != PACK_MAGIC:
+        raise ValueError("Not packed OCR output")
+    (count,) = struct.unpack_from('<I', raw, 4)
+    offset = 8
+    corners = np.frombuffer(raw, dtype='<f4', count=count * 8, offset=offset).reshape(count, 4, 2).astype(np.float32)
+    offset += count * 32
+    confidences = np.frombuffer(raw, dtype='<f4', count=count, offset=offset).astype(np.float32)
+    offset += count * 4
+    lengths = np.frombuffer(raw, dtype='<u4', count=count, offset=offset)
+    offset += count * 4
+    texts = []
+    for length in lengths.tolist():
+        texts.append(raw[offset:offset + length].decode('utf-8'))
+        offset += length
+    return OCRBoxes(corners, texts, confidences)
 
-    serving_info, calorie_info, nutrient_table = [], [], []
-    
-    for row in rows:
-        result = extract_section_fuzzy(row)
-        if result:
-            section = result[1]
-            row_text = " ".join(result[0])
-            if section == "serving_info":
-                serving_info.append(row_text)
-            elif section == "calorie_info":
-                calorie_info.append(row_text)
-            elif section == "nutrient_table":
-                nutrient_table.append(row_text)
-
-    def parse_general_info(text):
-        """Regular expression to extract general info""" 
-        patterns = [
-                    (r"(serving size[:\s]*([\w\s/()]+))|([\w\s/()]+)\s*per serving|([\w\s/()]+)\s*per unit", "Serving Size"),
-                    (r"(servings? per (container|package)[:\s]*(about\s)?(\d+))|((about\s)?(\d+)\s*servings? per (container|package))", "Servings per Container"),
-                    (r"(calories[:\s]*(\d+))|(\d+)\s*calories per serving", "Calories")
-                ]
-        results = {}
-        for pattern, category in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                if category == "Serving Size":
-                    results[category] = match.group(2) or match.group(3) or match.group(4)
-                elif category == "Servings per Container":
-                    results[category] = match.group(4) or match.group(7)
-                elif category == "Calories":
-                    results[category] = match.group(2) or match.group(3)
-                if results[category]:
-                    results[category] = results[category].strip().capitalize()
-                    if category == "Serving Size" and results[category].lower() in ["amount", "per unit"]:
-                        del results[category]
-                    elif category == "Servings per Container" and results[category].lower() in ["about"]:
-                        del results[category]
-        return results
+def reparse_packed(items):
+    """[(key, nutrition info)] for [(key, pack_boxes() output)], parsed with the current parser
 
-    nutrition_info = {}
-    for text in serving_info + calorie_info:
-        nutrition_info.update(parse_general_info(text))
-    
-    """Regular expression to extract amount and daily value with units""" 
-    amount_regex = re.compile(r"(\d+(\.\d+)?\s*(g|mg|kcal|mcg))")  
-    daily_value_regex = re.compile(r"(\d+(\.\d+)?\s*%)") 
-
-    def parse_nutrient_line_fuzzy(text, threshold=75):
-        """extrcat nutrition amount and daily value using fuzzy matching.""" 
-        result = {"nutrient": None, "amount": None, "daily_value": None} 
-        text = text.replace("Omg", "0mg").replace("Og", "0g").replace("O%", "0%")
-        
-        match, score, _ = process.extractOne(text, section_keywords['nutrient_table'], scorer=fuzz.partial_ratio)
-        if score >= threshold:  
-            if "Sugars" in text:
-                if "Added" in text:
-                    if "includes" in text or "included" in text:
-                        result["nutrient"] = None  
-                    else:
-                        result["nutrient"] = "Added Sugars"
+    Runs in worker processes of the reparse command, so it only needs the
+    parser, not PaddleOCR.
+    """
+    return [(key, parse_nutrition_info(unpack_boxes(data))) for key, data in items]
+
+def estimate_skew(corners):
+    """median angle, in radians, of the boxes' top edges"""
+    if not len(corners):
+        return 0.0
+    dx = corners[:, 1, 0] - corners[:, 0, 0]
+    dy = corners[:, 1, 1] - corners[:, 0, 1]
+    return float(np.median(np.arctan2(dy, dx)))
+
+# starts with a word, and is not an amount with zeros read as O such as "Omg" or "O%"
+COLUMN_LABEL_REGEX = re.compile(r"(?![Oo0-9.,]+\s*(mcg|mg|g|%)?$)[A-Za-z]")
+
+def row_order(corners, y_threshold=None, row_gap=0.5, deskew=True, texts=None, column_gap=1.0):
+    """reading order of the boxes and the bounds of each row within it
+
+    Box centres are rotated by the median skew when deskew is on, sorted
+    by y and split wherever two neighbours are further apart than
+    y_threshold, which defaults to row_gap times the median box height so
+    that it scales with the image resolution. With texts, a row is also
+    split where a box holding a number is followed, more than column_gap
+    median heights to its right, by one starting with a letter: labels that
+    print two nutrients side by side ("Vit. D 0mcg 0%   Calcium 290mg 20%")
+    then give one row per nutrient. Row k is
+    reading_order[bounds[k]:bounds[k + 1]], left to right.
+    """
+    if not len(corners):
+        return [], [0]
+    xs, ys = corners[:, :, 0], corners[:, :, 1]
+    if deskew:
+        angle = estimate_skew(corners)
+        cos, sin = np.cos(angle), np.sin(angle)
+        xs, ys = xs * cos + ys * sin, ys * cos - xs * sin
+    x = (xs[:, 0] + xs[:, 2]) * 0.5
+    y = (ys[:, 0] + ys[:, 2]) * 0.5
+    heights = np.hypot(corners[:, 3, 0] - corners[:, 0, 0], corners[:, 3, 1] - corners[:, 0, 1])
+    median_height = max(float(np.median(heights)), 1.0)
+    if y_threshold is None:
+        y_threshold = row_gap * median_height
+
+    order = np.argsort(y, kind='stable')
+    row_ids = np.empty(len(order), dtype=np.int64)
+    row_ids[order] = np.concatenate([[0], np.cumsum(np.diff(y[order]) > y_threshold)])
+    reading_order = np.lexsort((x, row_ids))
+    breaks = np.diff(row_ids[reading_order]) != 0
+    if texts is not None:
+        is_value = np.fromiter((any(c.isdigit() for c in text) for text in texts), dtype=bool, count=len(texts))
+        is_label = np.fromiter((bool(COLUMN_LABEL_REGEX.match(text)) for text in texts), dtype=bool, count=len(texts))
+        left, right = reading_order[:-1], reading_order[1:]
+        gaps = xs[right].min(axis=1) - xs[left].max(axis=1)
+        breaks |= (gaps > column_gap * median_height) & is_value[left] & is_label[right]
+    bounds = [0] + (np.flatnonzero(breaks) + 1).tolist() + [len(order)]
+    return reading_order.tolist(), bounds
+
+def group_rows(corners, y_threshold=None, row_gap=0.5, deskew=True, texts=None):
+    """box indices per row, rows top to bottom and boxes left to right"""
+    reading_order, bounds = row_order(corners, y_threshold, row_gap, deskew, texts)
+    return [reading_order[start:end] for start, end in zip(bounds, bounds[1:])]
+
+def extract_row_lines(ocr_output, y_threshold=None, deskew=True):
+    """extract info line by line"""
+    boxes = ocr_output if isinstance(ocr_output, OCRBoxes) else ocr_boxes_to_array(ocr_output)
+    reading_order, bounds = row_order(boxes.corners, y_threshold, deskew=deskew, texts=boxes.texts)
+    texts = [boxes.texts[i] for i in reading_order]
+    return [texts[start:end] for start, end in zip(bounds, bounds[1:])]
+
+def preprocess_text(text):
+    """lowercase and eliminate spaces"""
+    return re.sub(r"[^a-zA-Z0-9\s]", "", text.lower())
+
+SECTION_KEYWORDS = {
+    "serving_info": ["Serving Size", "Servings per Container", "Servings per Package"],
+    "calorie_info": ["Calories"],
+    "nutrient_table": ["Total Fat", "Saturated Fat","Trans Fat", "Cholesterol", "Sodium", "Total Carbohydrates", "Dietary Fiber", "Total Sugars", "Added Sugars", "Protein", "Vitamin D", "Calcium", "Iron", "Potasium"]
+}
+
+PRIORITY_ORDER = ["nutrient_table", "calorie_info", "serving_info"]
+
+class NutritionMatcher:
+    """precompiled fuzzy matcher for OCR rows
+
+    Keywords are normalized once. All rows are scored against all keywords
+    in one rapidfuzz cdist call; keywords are laid out in priority order so
+    the first best column of a row is the keyword the old per-keyword loop
+    picked.
+    """
+
+    def __init__(self, section_keywords=SECTION_KEYWORDS, priority_order=PRIORITY_ORDER,
+                 section_threshold=85, nutrient_threshold=75, workers=1):
+        keywords = [(section, keyword) for section in priority_order for keyword in section_keywords[section]]
+        self.keyword_sections = [section for section, _ in keywords]
+        self.section_keywords = [preprocess_text(keyword) for _, keyword in keywords]
+        self.nutrients = list(section_keywords["nutrient_table"])
+        self.section_threshold = section_threshold
+        self.nutrient_threshold = nutrient_threshold
+        self.workers = workers
+
+    def _best(self, texts, keywords):
+        """(index, score) of the best keyword for every text"""
+        scores = process.cdist(texts, keywords, scorer=fuzz.partial_ratio, dtype=np.float64, workers=self.workers)
+        best = scores.argmax(axis=1)
+        return best, scores[np.arange(len(texts)), best]
+
+    def classify_rows(self, rows):
+        """section of every row, or None where no keyword scores above the threshold"""
+        if not rows:
+            return []
+        texts = [preprocess_text(" ".join(row)) for row in rows]
+        best, scores = self._best(texts, self.section_keywords)
+        return [self.keyword_sections[i] if score > self.section_threshold else None for i, score in zip(best, scores)]
+
+    def parse_nutrient_lines(self, lines):
+        """nutrient, amount and daily value of every nutrient table line"""
+        if not lines:
+            return []
+        texts = [line.replace("Omg", "0mg").replace("Og", "0g").replace("O%", "0%") for line in lines]
+        best, scores = self._best(texts, self.nutrients)
+        return [parse_nutrient_line(text, self.nutrients[i], score, self.nutrient_threshold)
+                for text, i, score in zip(texts, best, scores)]
+
+def parse_general_info(text):
+    """Regular expression to extract general info""" 
+    patterns = [
+                (r"(serving size[:\s]*([\w\s/()]+))|([\w\s/()]+)\s*per serving|([\w\s/()]+)\s*per unit", "Serving Size"),
+                (r"(servings? per (container|package)[:\s]*(about\s)?(\d+))|((about\s)?(\d+)\s*servings? per (container|package))", "Servings per Container"),
+                (r"(calories[:\s]*(\d+))|(\d+)\s*calories per serving", "Calories")
+            ]
+    results = {}
+    for pattern, category in patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            if category == "Serving Size":
+                results[category] = match.group(2) or match.group(3) or match.group(4)
+            elif category == "Servings per Container":
+                results[category] = match.group(4) or match.group(7)
+            elif category == "Calories":
+                results[category] = match.group(2) or match.group(3)
+            if results[category]:
+                results[category] = results[category].strip().capitalize()
+                if category == "Serving Size" and results[category].lower() in ["amount", "per unit"]:
+                    del results[category]
+                elif category == "Servings per Container" and results[category].lower() in ["about"]:
+                    del results[category]
+    return results
+
+"""Regular expression to extract amount and daily value with units""" 
+amount_regex = re.compile(r"(\d+(\.\d+)?\s*(g|mg|kcal|mcg))")  
+daily_value_regex = re.compile(r"(\d+(\.\d+)?\s*%)") 
+OTHER_VITAMIN_REGEX = re.compile(r"vit(amin|\.)?\s*[abce-z]\b", re.IGNORECASE)
+
+def parse_nutrient_line(text, match, score, threshold=75):
+    """extract nutrition amount and daily value from a line whose best fuzzy keyword is match"""
+    result = {"nutrient": None, "amount": None, "daily_value": None} 
+
+    if score >= threshold:  
+        if "Sugars" in text:
+            if "Added" in text:
+                if "includes" in text or "included" in text:
+                    result["nutrient"] = None  
                 else:
-                    result["nutrient"] = "Total Sugars"
+                    result["nutrient"] = "Added Sugars"
             else:
-                result["nutrient"] = match
+                result["nutrient"] = "Total Sugars"
+        elif match == "Vitamin D" and OTHER_VITAMIN_REGEX.search(text):
+            # "Vitamin A 0%" on older labels is close enough to match "Vitamin D"
+            result["nutrient"] = None
+        else:
+            result["nutrient"] = match
+
+    amount_match = amount_regex.search(text)
+    if amount_match:
+        result["amount"] = amount_match.group(1).strip()
 
-        amount_match = amount_regex.search(text)
-        if amount_match:
-            result["amount"] = amount_match.group(1).strip()
+    daily_value_match = daily_value_regex.search(text)
+    if daily_value_match:
+        result["daily_value"] = daily_value_match.group(1).strip()
 
-        daily_value_match = daily_value_regex.search(text)
-        if daily_value_match:
-            result["daily_value"] = daily_value_match.group(1).strip()
+    return result
 
-        return result
+default_matcher = NutritionMatcher()
+
+def parse_nutrition_info(ocr_output, matcher=None):
+    """parse PaddleOCR boxes ([box, (text, score)] per line, or OCRBoxes) into nutrition info"""
+    matcher = matcher or default_matcher
+    rows = extract_row_lines(ocr_output)
+
+    serving_info, calorie_info, nutrient_table = [], [], []
+    
+    for row, section in zip(rows, matcher.classify_rows(rows)):
+        row_text = " ".join(row)
+        if section == "serving_info":
+            serving_info.append(row_text)
+        elif section == "calorie_info":
+            calorie_info.append(row_text)
+        elif section == "nutrient_table":
+            nutrient_table.append(row_text)
+
+    nutrition_info = {}
+    for text in serving_info + calorie_info:
+        nutrition_info.update(parse_general_info(text))
 
     nutrient_info_dict = {}
 
-    for line in nutrient_table:
-        nutrient_info = parse_nutrient_line_fuzzy(line)
+    for nutrient_info in matcher.parse_nutrient_lines(nutrient_table):
         if nutrient_info["nutrient"]: 
             nutrient_info_dict[nutrient_info["nutrient"]] = nutrient_info
 
@@ -153,7 +470,7 @@ def extract_nutrition_info(image):
         "Calories": nutrition_info.get("Calories"),
     }
 
-    for nutrient in section_keywords["nutrient_table"]:
+    for nutrient in matcher.nutrients:
         data[f"{nutrient} (Amount)"] = nutrient_info_dict.get(nutrient, {}).get("amount")
         data[f"{nutrient} (Daily Value)"] = nutrient_info_dict.get(nutrient, {}).get("daily_value")
 
@@ -0,0 +1,414 @@
+"""Benchmark and regression check for the OCR output parser
+
+Runs ocr.parse_nutrition_info on stored OCR outputs (parser_corpus/*.json,
+recorded with --record or transcribed by hand) and on synthetic labels
+generated from a fixed seed, so no OCR model is needed. Stored labels carry
+a hand-verified "truth" next to the parser's "expected" output: --check
+fails when a result changes or a field is read with a value the truth
+does not have, and lists the fields the parser still misses.
+
+    python parser_benchmark.py               # labels/second and time per parser stage
+    python parser_benchmark.py --check       # exit 1 if any parsed result or unit case changed
+    python parser_benchmark.py --update      # rewrite the expected results after an intended change
+    python parser_benchmark.py --record a.jpg b.jpg   # add cropped label photos to the corpus (runs PaddleOCR)
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from functools import wraps
+
+import ocr
+import units
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parser_corpus')
+SYNTHETIC_EXPECTED = os.path.join(CORPUS_DIR, 'synthetic', 'expected.json')
+SEED = 12
+
+# text -> units.parse_number result
+UNIT_CASES = {
+    "140mg": (140.0, 'mg'),
+    "2.5g": (2.5, 'g'),
+    "1,5g": (1.5, 'g'),
+    "0,25 g": (0.25, 'g'),
+    "1,200mg": (1200.0, 'mg'),
+    "12,500 mcg": (12500.0, 'mcg'),
+    "20%": (20.0, '%'),
+    "110 Cal": (110.0, 'kcal'),
+}
+
+# nutrient name, unit, (min, max) amount, daily value reference or None
+NUTRIENT_ROWS = [
+    ("Total Fat", "g", (0, 40), 78),
+    ("Saturated Fat", "g", (0, 15), 20),
+    ("Trans Fat", "g", (0, 2), None),
+    ("Cholesterol", "mg", (0, 300), 300),
+    ("Sodium", "mg", (0, 2000), 2300),
+    ("Total Carbohydrates", "g", (0, 80), 275),
+    ("Dietary Fiber", "g", (0, 15), 28),
+    ("Total Sugars", "g", (0, 40), None),
+    ("Added Sugars", "g", (0, 30), 50),
+    ("Protein", "g", (0, 40), None),
+    ("Vitamin D", "mcg", (0, 20), 20),
+    ("Calcium", "mg", (0, 1300), 1300),
+    ("Iron", "mg", (0, 18), 18),
+    ("Potasium", "mg", (0, 4700), 4700),
+]
+
+SERVING_SIZES = ["1 cup (228g)", "2/3 cup (55g)", "1 bar (40g)", "3 pieces (28g)", "1 tbsp (15ml)", "1 can (355ml)"]
+
+# ingredient-list words that share no fuzzy section keyword
+FILLER_WORDS = [
+    "ingredients", "whole", "grain", "oats", "wheat", "flour", "cane", "honey", "malt", "syrup", "canola",
+    "oil", "baking", "soda", "natural", "flavor", "contains", "soy", "lecithin", "rice", "peanut", "butter",
+    "distributed", "by", "best", "before", "store", "cool", "dry", "place", "made", "in", "facility", "that",
+    "also", "processes", "milk", "eggs", "nuts",
+]
+
+class Canvas:
+    """lays out text boxes in PaddleOCR format, optionally rotated and scaled"""
+
+    def __init__(self, rng, scale=1.0, skew_degrees=0.0, jitter=0.0):
+        self.rng = rng
+        self.scale = scale
+        self.angle = math.radians(skew_degrees)
+        self.jitter = jitter
+        self.boxes = []
+        self.y = 20.0
+
+    def _point(self, x, y):
+        cos, sin = math.cos(self.angle), math.sin(self.angle)
+        return [round((x * cos - y * sin) * self.scale, 1), round((x * sin + y * cos) * self.scale, 1)]
+
+    def text(self, x, text, height=18.0, confidence=None):
+        y = self.y + self.rng.uniform(-self.jitter, self.jitter)
+        width = 9.0 * len(text)
+        corners = [self._point(x, y), self._point(x + width, y), self._point(x + width, y + height), self._point(x, y + height)]
+        confidence = confidence if confidence is not None else round(self.rng.uniform(0.85, 0.999), 4)
+        self.boxes.append([corners, [text, confidence]])
+
+    def next_row(self, spacing=26.0):
+        self.y += spacing
+
+    def ocr_output(self, shuffle=True):
+        boxes = list(self.boxes)
+        if shuffle:
+            self.rng.shuffle(boxes)
+        return boxes
+
+def ocr_noise(rng, text, rate):
+    """OCR-style misreads: zero read as O, dropped letters"""
+    if rng.random() < rate:
+        text = text.replace("0g", "Og").replace("0mg", "Omg").replace("0%", "O%")
+    if rng.random() < rate / 2 and len(text) > 6:
+        i = rng.randrange(1, len(text) - 1)
+        if text[i].isalpha():
+            text = text[:i] + text[i + 1:]
+    return text
+
+def filler_row(canvas, rng):
+    x = 10.0
+    for _ in range(rng.randint(1, 3)):
+        words = " ".join(rng.choice(FILLER_WORDS) for _ in range(rng.randint(2, 5)))
+        canvas.text(x, words, height=14.0)
+        x += 9.0 * len(words) + 20
+    canvas.next_row(20.0)
+
+def synthetic_label(rng, noise=0.0, filler_rows=0, repeat_table=1, scale=1.0, skew=0.0, jitter=0.0):
+    """one generated label as (ocr_output, ground truth in parse_nutrition_info format)"""
+    canvas = Canvas(rng, scale=scale, skew_degrees=skew, jitter=jitter)
+    truth = {}
+
+    servings = rng.randint(1, 12)
+    serving_size = rng.choice(SERVING_SIZES)
+    calories = rng.randint(0, 600)
+    truth["Serving Size"] = serving_size.capitalize()
+    truth["Servings per Container"] = str(servings)
+    truth["Calories"] = str(calories)
+
+    canvas.text(10, "Nutrition Facts", height=30.0)
+    canvas.next_row(40.0)
+    canvas.text(10, f"{servings} servings per container")
+    canvas.next_row()
+    canvas.text(10, "Serving size")
+    canvas.text(200, serving_size)
+    canvas.next_row(36.0)
+    canvas.text(10, "Amount per serving", height=14.0)
+    canvas.next_row(20.0)
+    canvas.text(10, "Calories", height=30.0)
+    canvas.text(260, str(calories), height=30.0)
+    canvas.next_row(44.0)
+    canvas.text(240, "% Daily Value*", height=14.0)
+    canvas.next_row(20.0)
+
+    for _ in range(repeat_table):
+        for name, unit, (low, high), reference in NUTRIENT_ROWS:
+            value = rng.randint(low, high)
+            amount = f"{value}{unit}"
+            label = f"Includes {amount} Added Sugars" if name == "Added Sugars" else f"{name} {amount}"
+            canvas.text(10, ocr_noise(rng, label, noise))
+            truth[f"{name} (Amount)"] = amount
+            truth[f"{name} (Daily Value)"] = None
+            if reference:
+                daily_value = f"{round(100 * value / reference)}%"
+                canvas.text(260, ocr_noise(rng, daily_value, noise))
+                truth[f"{name} (Daily Value)"] = daily_value
+            canvas.next_row()
+        for _ in range(filler_rows):
+            filler_row(canvas, rng)
+
+    return canvas.ocr_output(), truth
+
+# name -> (number of labels, generator options)
+SYNTHETIC_SETS = {
+    'clean': (200, {}),
+    'noisy': (200, {'noise': 0.3, 'jitter': 3.0, 'filler_rows': 2}),
+    'skewed_hires': (100, {'scale': 4.0, 'skew': 4.0, 'jitter': 2.0}),
+    'dense': (20, {'noise': 0.1, 'filler_rows': 10, 'repeat_table': 15}),
+    'huge': (2, {'noise': 0.1, 'filler_rows': 150, 'repeat_table': 20}),
+}
+
+def synthetic_corpus(seed=SEED):
+    """deterministic synthetic cases as dicts with name, ocr_output and truth"""
+    rng = random.Random(seed)
+    cases = []
+    for set_name, (count, options) in SYNTHETIC_SETS.items():
+        for i in range(count):
+            ocr_output, truth = synthetic_label(rng, **options)
+            cases.append({'name': f"synthetic/{set_name}/{i:03d}", 'set': set_name, 'ocr_output': ocr_output, 'truth': truth})
+    return cases
+
+def stored_corpus():
+    """cases saved as parser_corpus/*.json"""
+    cases = []
+    for filename in sorted(os.listdir(CORPUS_DIR)):
+        if not filename.endswith('.json'):
+            continue
+        with open(os.path.join(CORPUS_DIR, filename)) as f:
+            case = json.load(f)
+        case['name'] = f"stored/{filename[:-5]}"
+        case['set'] = 'stored'
+        cases.append(case)
+    return cases
+
+def load_expected(cases):
+    """attach the stored expected result to every synthetic case"""
+    try:
+        with open(SYNTHETIC_EXPECTED) as f:
+            expected = json.load(f)
+    except FileNotFoundError:
+        expected = {}
+    for case in cases:
+        if case['set'] != 'stored':
+            case['expected'] = expected.get(case['name'])
+    return cases
+
+def corpus():
+    return load_expected(stored_corpus() + synthetic_corpus())
+
+PROFILED = [
+    (ocr, 'ocr_boxes_to_array'),
+    (ocr, 'row_order'),
+    (ocr, 'extract_row_lines'),
+    (ocr.NutritionMatcher, 'classify_rows'),
+    (ocr, 'parse_general_info'),
+    (ocr.NutritionMatcher, 'parse_nutrient_lines'),
+    (ocr, 'parse_nutrition_info'),
+]
+
+def instrument(timings):
+    """wrap the parser stages so every call adds its duration to timings[name]"""
+    originals = []
+    for owner, name in PROFILED:
+        original = getattr(owner, name)
+        originals.append((owner, name, original))
+
+        def timed(*args, _original=original, _name=name, **kwargs):
+            start = time.perf_counter()
+            try:
+                return _original(*args, **kwargs)
+            finally:
+                timings[_name] += time.perf_counter() - start
+
+        setattr(owner, name, wraps(original)(timed))
+    return originals
+
+def restore(originals):
+    for owner, name, original in originals:
+        setattr(owner, name, original)
+
+def benchmark(cases, repeat):
+    by_set = defaultdict(list)
+    for case in cases:
+        by_set[case['set']].append(case)
+
+    print(f"{'set':<14}{'labels':>8}{'boxes/label':>13}{'labels/s':>12}{'ms/label':>10}")
+    for set_name, set_cases in by_set.items():
+        boxes = sum(len(case['ocr_output']) for case in set_cases) / len(set_cases)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for case in set_cases:
+                ocr.parse_nutrition_info(case['ocr_output'])
+        elapsed = time.perf_counter() - start
+        labels = len(set_cases) * repeat
+        print(f"{set_name:<14}{len(set_cases):>8}{boxes:>13.0f}{labels / elapsed:>12.1f}{1000 * elapsed / labels:>10.2f}")
+
+    timings = defaultdict(float)
+    originals = instrument(timings)
+    try:
+        for case in cases:
+            ocr.parse_nutrition_info(case['ocr_output'])
+    finally:
+        restore(originals)
+
+    # nested stages are included in their caller's time
+    total = timings['parse_nutrition_info']
+    print(f"\n{'function':<24}{'total ms':>10}{'share':>8}")
+    for _, name in PROFILED:
+        print(f"{name:<24}{1000 * timings[name]:>10.1f}{100 * timings[name] / total:>7.1f}%")
+
+def accuracy(cases):
+    """share of ground truth fields the parser gets right per synthetic set, and how often
+    a fast OCR tier result like each label would be escalated to the accurate tier"""
+    correct, fields = defaultdict(int), defaultdict(int)
+    escalated, labels = defaultdict(int), defaultdict(int)
+    for case in cases:
+        boxes = ocr.ocr_boxes_to_array(case['ocr_output'])
+        result = ocr.parse_nutrition_info(boxes)
+        labels[case['set']] += 1
+        escalated[case['set']] += ocr.needs_escalation(result, boxes)
+        for key, value in case.get('truth', {}).items():
+            fields[case['set']] += 1
+            correct[case['set']] += result.get(key) == value
+    for set_name in labels:
+        line = f"{set_name:<14}{100 * escalated[set_name] / labels[set_name]:>6.1f}% would escalate"
+        if fields[set_name]:
+            line += f", {100 * correct[set_name] / fields[set_name]:.1f}% of fields match ground truth"
+        print(line)
+
+def wrong_fields(result, truth):
+    """{key: (truth, result)} for fields read with a value that is not the true one; fields left empty are not wrong"""
+    return {key: (value, result.get(key)) for key, value in truth.items()
+            if result.get(key) is not None and result.get(key) != value}
+
+def check(cases):
+    changed = 0
+    for case in cases:
+        if case['set'] == 'stored' and 'truth' in case:
+            result = ocr.parse_nutrition_info(case['ocr_output'])
+            wrong = wrong_fields(result, case['truth'])
+            missed = sorted(key for key, value in case['truth'].items() if value is not None and result.get(key) is None)
+            if missed:
+                print(f"MISSES   {case['name']}: {', '.join(missed)}")
+            if wrong:
+                changed += 1
+                print(f"WRONG    {case['name']}")
+                for key, (truth, got) in sorted(wrong.items()):
+                    print(f"    {key}: truth {truth!r}, got {got!r}")
+                continue
+        if case.get('expected') is None:
+            print(f"MISSING  {case['name']}: no expected result, run --update")
+            changed += 1
+            continue
+        result = ocr.parse_nutrition_info(case['ocr_output'])
+        diff = {key: (case['expected'].get(key), result.get(key))
+                for key in set(result) | set(case['expected']) if result.get(key) != case['expected'].get(key)}
+        if diff:
+            changed += 1
+            print(f"CHANGED  {case['name']}")
+            for key, (expected, got) in sorted(diff.items()):
+                print(f"    {key}: expected {expected!r}, got {got!r}")
+    print(f"{len(cases) - changed}/{len(cases)} labels parse as expected")
+    return changed == 0
+
+def check_units():
+    wrong = 0
+    for text, expected in UNIT_CASES.items():
+        got = units.parse_number(text)
+        if got != expected:
+            wrong += 1
+            print(f"CHANGED  unit {text!r}: expected {expected!r}, got {got!r}")
+    print(f"{len(UNIT_CASES) - wrong}/{len(UNIT_CASES)} unit cases parse as expected")
+    return wrong == 0
+
+def update(cases):
+    """store the current parser output as the expected result of every case"""
+    expected = {}
+    for case in cases:
+        result = ocr.parse_nutrition_info(case['ocr_output'])
+        if case['set'] == 'stored':
+            path = os.path.join(CORPUS_DIR, f"{case['name'].split('/', 1)[1]}.json")
+            with open(path) as f:
+                stored = json.load(f)
+            stored['expected'] = result
+            write_json(path, stored)
+        else:
+            expected[case['name']] = result
+    # one line per label keeps the file small and its diffs readable
+    os.makedirs(os.path.dirname(SYNTHETIC_EXPECTED), exist_ok=True)
+    with open(SYNTHETIC_EXPECTED, 'w') as f:
+        f.write("{\n" + ",\n".join(f"{json.dumps(name)}: {json.dumps(result)}" for name, result in expected.items()) + "\n}\n")
+    print(f"Updated expected results for {len(cases)} labels")
+
+def write_json(path, value):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(value, f, indent=1)
+        f.write('\n')
+
+def record(paths):
+    """run PaddleOCR on cropped label images and save the raw boxes to the corpus
+
+    The images go in as the upload pipeline hands crops to PaddleOCR: BGR
+    arrays sized by ocr.ocr_input. Add a "truth" block by hand afterwards.
+    """
+    import cv2
+
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            print(f"Skipping {path}: not an image")
+            continue
+        with ocr.OCR_TIERS['accurate'].engine() as engine:
+            result = engine.ocr(ocr.ocr_input(image), cls=True)
+        ocr_output = [[box, [text, score]] for box, (text, score) in (result[0] or [])]
+        name = os.path.splitext(os.path.basename(path))[0]
+        write_json(os.path.join(CORPUS_DIR, f"{name}.json"), {
+            'source': f"PaddleOCR {os.path.basename(path)}",
+            'ocr_output': ocr_output,
+            'expected': ocr.parse_nutrition_info(ocr_output),
+        })
+        print(f"Recorded {path} ({len(ocr_output)} boxes)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--check', action='store_true', help="compare results with the expected ones")
+    parser.add_argument('--update', action='store_true', help="store current results as the expected ones")
+    parser.add_argument('--record', nargs='+', metavar='IMAGE', help="OCR cropped label images into the corpus")
+    parser.add_argument('--repeat', type=int, default=3, help="benchmark passes over the corpus")
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record)
+        return 0
+
+    cases = corpus()
+    if args.update:
+        update(cases)
+        return 0
+    if args.check:
+        labels_ok = check(cases)
+        return 0 if check_units() and labels_ok else 1
+
+    benchmark(cases, args.repeat)
+    print()
+    accuracy(cases)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -10,6 +10,7 @@ CREATE TABLE User (
 
 CREATE TABLE Nutrition (
     id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT,
     servings_size VARCHAR(100),
     servings_per_container VARCHAR(100),
     calories_per_serving VARCHAR(100),
@@ -40,5 +41,52 @@ CREATE TABLE Nutrition (
     iron_amount VARCHAR(100),
     iron_dv VARCHAR(100),
     potassium_amount VARCHAR(100),
-    potassium_dv VARCHAR(100)
+    potassium_dv VARCHAR(100),
+    servings_per_container_count FLOAT,
+    calories_kcal FLOAT,
+    total_fat_g FLOAT,
+    total_fat_dv_pct FLOAT,
+    saturated_fat_g FLOAT,
+    saturated_fat_dv_pct FLOAT,
+    trans_fat_g FLOAT,
+    trans_fat_dv_pct FLOAT,
+    cholesterol_mg FLOAT,
+    cholesterol_dv_pct FLOAT,
+    sodium_mg FLOAT,
+    sodium_dv_pct FLOAT,
+    total_carbohydrates_g FLOAT,
+    total_carbohydrates_dv_pct FLOAT,
+    dietary_fiber_g FLOAT,
+    dietary_fiber_dv_pct FLOAT,
+    total_sugars_g FLOAT,
+    total_sugars_dv_pct FLOAT,
+    added_sugars_g FLOAT,
+    added_sugars_dv_pct FLOAT,
+    protein_g FLOAT,
+    protein_dv_pct FLOAT,
+    vitamin_d_mcg FLOAT,
+    vitamin_d_dv_pct FLOAT,
+    calcium_mg FLOAT,
+    calcium_dv_pct FLOAT,
+    iron_mg FLOAT,
+    iron_dv_pct FLOAT,
+    potassium_mg FLOAT,
+    potassium_dv_pct FLOAT,
+    ocr_tier VARCHAR(16),
+    upload_sha256 VARCHAR(64),
+    crop_sha256 VARCHAR(64),
+    ocr_raw MEDIUMBLOB,
+    created_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    updated_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    INDEX ix_nutrition_calories_kcal (calories_kcal),
+    INDEX ix_nutrition_total_fat_g (total_fat_g),
+    INDEX ix_nutrition_saturated_fat_g (saturated_fat_g),
+    INDEX ix_nutrition_sodium_mg (sodium_mg),
+    INDEX ix_nutrition_total_sugars_g (total_sugars_g),
+    INDEX ix_nutrition_added_sugars_g (added_sugars_g),
+    INDEX ix_nutrition_protein_g (protein_g),
+    INDEX ix_nutrition_user_id_id (user_id, id),
+    INDEX ix_nutrition_user_id_updated_at (user_id, updated_at),
+    INDEX ix_nutrition_upload_sha256 (upload_sha256),
+    CONSTRAINT fk_nutrition_user_id_user FOREIGN KEY (user_id) REFERENCES User (id)
 );
\ No newline at end of file
@@ -0,0 +1,130 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+class ResultCache:
+    """SHA-256 keyed cache of processed labels
+
+    A bounded in-memory LRU sits in front of one JSON file per key on disk,
+    so results survive restarts and are shared by every worker process. A
+    sweeper removes files not read or written for max_age seconds, then the
+    least recently used ones until the files take at most max_bytes.
+    """
+
+    def __init__(self, directory='cache/labels', max_entries=1024, max_bytes=1024 ** 3, max_age=30 * 86400):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._sweeper = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = {'memory': 0, 'disk': 0}
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _remember(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        """cached value for key, or None"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits['memory'] += 1
+                return self._entries[key]
+
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                value = json.load(f)
+            # a read counts as a use for eviction
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits['disk'] += 1
+            self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        """store value in memory and write it through to disk"""
+        with self._lock:
+            self._remember(key, value)
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # unique per process and thread: forked workers share the directory
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+
+    def _files(self):
+        """(mtime, size, path) of every file on disk, including temp files of interrupted writes"""
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, stat.st_size, entry.path
+
+    def sweep(self, now=None):
+        """remove files past max_age, then the least recently used until the total fits max_bytes; returns the count removed"""
+        if not os.path.isdir(self.directory):
+            return 0
+        now = now or time.time()
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for mtime, size, path in files:
+            if now - mtime <= self.max_age and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def start_sweeper(self, interval=600):
+        """sweep every interval seconds on a daemon thread"""
+        if self._sweeper is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    removed = self.sweep()
+                    if removed:
+                        logging.info(f"Evicted {removed} cached results from {self.directory}")
+                except Exception as e:
+                    logging.error(f"Result cache sweep failed: {e}")
+
+        self._sweeper = threading.Thread(target=run, name='result-cache-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'memory_hits': self.hits['memory'],
+                'disk_hits': self.hits['disk'],
+                'misses': self.misses,
+                'entries_in_memory': len(self._entries)
+            }
@@ -0,0 +1,99 @@
+"""production server: gunicorn workers forked from a master that has already imported the app
+
+    python server.py
+
+The master downloads any missing models by running `flask warm-up` in a
+child process, imports the app, the pipeline and the model libraries, then
+freezes the garbage collector so those objects are never touched again.
+Workers forked from it share that memory copy-on-write. Paddle predictors,
+onnxruntime sessions and the Roboflow HTTP session are not safe to use
+across a fork, so each worker builds its own before it serves requests:
+SERVER_OCR_POOL_SIZE engines per OCR tier (1 by default) and a detector.
+Memory therefore grows with SERVER_WORKERS, which defaults to 2 rather
+than the core count. Workers are replaced after SERVER_MAX_REQUESTS
+requests (plus jitter, so they do not all restart at once).
+A worker that is replaced or stopped first waits up to SERVER_GRACEFUL_TIMEOUT
+seconds for the upload jobs it accepted.
+"""
+import gc
+import logging
+import os
+import subprocess
+import sys
+from dotenv import load_dotenv
+from gunicorn.app.base import BaseApplication
+
+load_dotenv()
+
+SERVER_BIND = os.getenv('SERVER_BIND', '0.0.0.0:5000')
+SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', 2))
+SERVER_THREADS = int(os.getenv('SERVER_THREADS', 4))
+SERVER_MAX_REQUESTS = int(os.getenv('SERVER_MAX_REQUESTS', 1000))
+SERVER_MAX_REQUESTS_JITTER = int(os.getenv('SERVER_MAX_REQUESTS_JITTER', 100))
+SERVER_TIMEOUT = int(os.getenv('SERVER_TIMEOUT', 120))
+# how long a stopping worker waits for its upload jobs; keep it below SERVER_TIMEOUT
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv('SERVER_GRACEFUL_TIMEOUT', 90))
+
+# engines per OCR tier in each worker; overrides OCR_POOL_SIZE and OCR_FAST_POOL_SIZE
+SERVER_OCR_POOL_SIZE = os.getenv('SERVER_OCR_POOL_SIZE', '1')
+os.environ['OCR_POOL_SIZE'] = os.environ['OCR_FAST_POOL_SIZE'] = SERVER_OCR_POOL_SIZE
+
+# every worker runs its own jobs; a shared status directory lets any of them answer a poll
+os.environ.setdefault('JOB_STATUS_DIR', 'cache/jobs')
+
+def pre_fork(server, worker):
+    # objects the master holds now are never collected, so the collector does not write to their pages in the workers
+    gc.freeze()
+
+def post_fork(server, worker):
+    """per-worker setup: fresh database connections, the models and the background threads a fork does not inherit"""
+    import app as backend
+    with backend.app.app_context():
+        for engine in backend.db.engines.values():
+            # connections opened by the master must not be shared with it
+            engine.dispose(close=False)
+    backend.warm_up()
+    backend.blob_store.start_sweeper(backend.STORAGE_SWEEP_INTERVAL)
+    backend.label_cache.start_sweeper(backend.STORAGE_SWEEP_INTERVAL)
+    logging.info(f"Worker {worker.pid} ready")
+
+def worker_exit(server, worker):
+    """let the jobs of a worker that is being replaced or stopped finish before it exits"""
+    import app as backend
+    if not backend.job_runner.drain(SERVER_GRACEFUL_TIMEOUT):
+        logging.warning(f"Worker {worker.pid} exited with unfinished jobs")
+
+class Server(BaseApplication):
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # building an engine downloads its models if they are missing; do it once, in a child
+        # that exits, so the workers do not race to download and the master holds no sessions
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'warm-up'], check=True,
+                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                       env={**os.environ, 'OCR_POOL_SIZE': '1', 'OCR_FAST_POOL_SIZE': '1'})
+        import app as backend
+        backend.preload()
+        return backend.app
+
+if __name__ == '__main__':
+    Server({
+        'bind': SERVER_BIND,
+        'workers': SERVER_WORKERS,
+        'worker_class': 'gthread',
+        'threads': SERVER_THREADS,
+        'preload_app': True,
+        'max_requests': SERVER_MAX_REQUESTS,
+        'max_requests_jitter': SERVER_MAX_REQUESTS_JITTER,
+        'timeout': SERVER_TIMEOUT,
+        'graceful_timeout': SERVER_GRACEFUL_TIMEOUT,
+        'pre_fork': pre_fork,
+        'post_fork': post_fork,
+        'worker_exit': worker_exit,
+    }).run()
@@ -0,0 +1,171 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+import metrics
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+READ_CHUNK_SIZE = 1024 * 1024
+# a temp file this old belongs to a write that died before it was moved into place
+TMP_MAX_AGE = 3600
+
+def read_stream(stream, chunk_size=READ_CHUNK_SIZE):
+    """(sha256 hex digest, bytes) of a file-like object, hashed chunk by chunk as it is read"""
+    digest = hashlib.sha256()
+    chunks = []
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+        chunks.append(chunk)
+    return digest.hexdigest(), b''.join(chunks)
+
+class BlobStore:
+    """content-addressed files under directory/ab/cd/<sha256>
+
+    Identical content is stored once. A sweeper removes blobs older than
+    max_age seconds and then the oldest ones until the store holds at most
+    max_bytes; storing content that already exists refreshes its age. Blobs
+    younger than grace seconds are kept even over max_bytes, since the jobs
+    that wrote them may not have stored their rows yet. Callers must cope
+    with a blob being gone.
+    """
+
+    def __init__(self, directory='storage', max_bytes=10 * 1024 ** 3, max_age=30 * 86400, grace=300):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.grace = grace
+        self._stop = threading.Event()
+        self._sweeper = None
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key[2:4], key)
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def put(self, data, key=None):
+        """store bytes under their sha256 (computed unless given) and return the key"""
+        key = key or hashlib.sha256(data).hexdigest()
+        path = self.path(key)
+        if os.path.exists(path):
+            os.utime(path)
+            metrics.STORAGE_DEDUPLICATED.inc()
+            return key
+
+        tmp_dir = os.path.join(self.directory, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = os.path.join(tmp_dir, uuid.uuid4().hex)
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        metrics.STORAGE_WRITTEN.inc()
+        return key
+
+    def _blobs(self):
+        """(mtime, size, path) of every stored blob"""
+        for first in os.scandir(self.directory):
+            if not first.is_dir() or len(first.name) != 2:
+                continue
+            for second in os.scandir(first.path):
+                if not second.is_dir():
+                    continue
+                for entry in os.scandir(second.path):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, entry.path
+
+    @contextmanager
+    def _sweep_lock(self):
+        """whether this process may sweep now; one process at a time sweeps a directory shared by workers"""
+        if fcntl is None:
+            yield True
+            return
+        with open(os.path.join(self.directory, '.sweep.lock'), 'w') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                yield False
+                return
+            yield True
+
+    def sweep(self, now=None):
+        """evict blobs past max_age, then the oldest until the total fits max_bytes; returns the count removed
+
+        Abandoned temp files are removed too.
+        """
+        if not os.path.isdir(self.directory):
+            return 0
+        with self._sweep_lock() as acquired:
+            if not acquired:
+                return 0
+            self._sweep_tmp(now)
+            return self._sweep(now)
+
+    def _sweep_tmp(self, now=None):
+        now = now or time.time()
+        try:
+            entries = list(os.scandir(os.path.join(self.directory, 'tmp')))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            try:
+                if now - entry.stat().st_mtime > TMP_MAX_AGE:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def _sweep(self, now=None):
+        now = now or time.time()
+        blobs = sorted(self._blobs())
+        total = sum(size for _, size, _ in blobs)
+        removed = 0
+        for mtime, size, path in blobs:
+            if now - mtime <= self.max_age and total <= self.max_bytes:
+                break
+            if now - mtime < self.grace:
+                # this and every later blob were just written
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+
+        metrics.STORAGE_EVICTED.inc(removed)
+        metrics.STORAGE_BYTES.set(total)
+        metrics.STORAGE_BLOBS.set(len(blobs) - removed)
+        return removed
+
+    def start_sweeper(self, interval=600):
+        """sweep every interval seconds on a daemon thread"""
+        if self._sweeper is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    removed = self.sweep()
+                    if removed:
+                        logging.info(f"Evicted {removed} blobs from {self.directory}")
+                except Exception as e:
+                    logging.error(f"Storage sweep failed: {e}")
+
+        self._sweeper = threading.Thread(target=run, name='storage-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
@@ -3,6 +3,12 @@ import requests
 import pandas as pd
 import plotly.express as px
 import re
+import time
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 st.set_page_config(page_title="Nutrition Dashboard", page_icon="🍽️",layout="wide")
 
@@ -12,6 +18,8 @@ if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
 if "email" not in st.session_state:
     st.session_state.email = None
+if "token" not in st.session_state:
+    st.session_state.token = None
 
 def register_user(email, password):
     # Handle user registration via API call
@@ -23,19 +31,64 @@ def login_user(email, password):
     response = requests.post(f"{API_BASE_URL}/login", json={"email": email, "password": password})
     return response.json(), response.status_code
 
+def auth_headers():
+    # API token from login, sent with every per-user request
+    return {"Authorization": f"Bearer {st.session_state.token}"}
+
+def wait_for_job(job_id, interval=0.5, timeout=300):
+    # Poll a background upload job until it finishes
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = requests.get(f"{API_BASE_URL}/jobs/{job_id}", headers=auth_headers()).json()
+        if job.get("status") in ["done", "failed"]:
+            return job
+        time.sleep(interval)
+    return {"status": "failed", "error": "Timed out waiting for the file to be processed"}
+
 def upload_document(file):
     # Handle food label file upload to backend for OCR
     files = {"file": file}
-    response = requests.post(f"{API_BASE_URL}/food_labels_db", files=files)
-    return response.json(), response.status_code
+    response = requests.post(f"{API_BASE_URL}/food_labels_db", files=files, headers=auth_headers())
+    if response.status_code != 202:
+        return response.json(), response.status_code
+
+    job = wait_for_job(response.json()["job_id"])
+    if job["status"] == "done":
+        return job, 200
+    return {"message": job.get("error") or "Failed to process the file"}, 500
 
 def fetch_database_entries():
-    # Fetch database entries from the backend
-    response = requests.get(f"{API_BASE_URL}/food_labels_db")
+    # Fetch database entries from the backend, reusing the cached DataFrame while its ETag still matches
+    cached = st.session_state.get("entries_cache")
+    headers = auth_headers()
+    if cached:
+        headers["If-None-Match"] = cached["etag"]
+    params = {"format": "msgpack"} if msgpack else {}
+
+    response = requests.get(f"{API_BASE_URL}/food_labels_db", headers=headers, params=params)
+    if response.status_code == 304:
+        return cached["entries"], 200
+    if response.status_code != 200:
+        return None, response.status_code
+
+    if msgpack:
+        unpacker = msgpack.Unpacker(raw=False)
+        unpacker.feed(response.content)
+        columns = next(unpacker)
+        entries = pd.DataFrame(list(unpacker), columns=columns)
+    else:
+        entries = pd.DataFrame(response.json())
+    if "ETag" in response.headers:
+        st.session_state.entries_cache = {"etag": response.headers["ETag"], "entries": entries}
+    return entries, response.status_code
+
+def fetch_latest_entry():
+    # Fetch only the most recent entry for the dashboard cards and chart
+    response = requests.get(f"{API_BASE_URL}/food_labels_db/latest", headers=auth_headers())
     if response.status_code == 200:
-        return pd.DataFrame(response.json()), response.status_code
+        return response.json(), response.status_code
     else:
-        return None, response.status_code 
+        return None, response.status_code
 
 if not st.session_state.logged_in:
     tab1, tab2 = st.tabs(["Register", "Login"])
@@ -85,6 +138,7 @@ if not st.session_state.logged_in:
             if status == 200:
                 st.session_state.logged_in = True
                 st.session_state.email = login_email
+                st.session_state.token = result["token"]
                 st.success("Logged in successfully!")
                 st.rerun()  
             else:
@@ -94,25 +148,28 @@ else:
     # When logged in
     tab1, tab2, tab3 = st.tabs(["Upload", "Dashboard", "Logout"])
 
-    if "nutrition_data" not in st.session_state:
-        st.session_state.nutrition_data, st.session_state.fetch_status = fetch_database_entries()
+    if "latest_entry" not in st.session_state:
+        st.session_state.latest_entry, st.session_state.fetch_status = fetch_latest_entry()
     with tab1:
         st.header("📄 Upload a Food Label Image 📝")
 
         uploaded_file = st.file_uploader("Please upload a Food Label below.", type=["jpg", "png", "pdf"])
 
         if uploaded_file is not None:
-            st.image(uploaded_file, caption="Uploaded Image", use_container_width=True)
+            if uploaded_file.type != "application/pdf":
+                st.image(uploaded_file, caption="Uploaded Image", use_container_width=True)
 
             with st.spinner("Processing the file..."):
                 result, status = upload_document(uploaded_file)
 
             if status == 200:
                 st.success("File uploaded and processed successfully!") 
+                if "pages" in result:
+                    st.info(f"Read {result['stored']} of {result['pages']} pages.")
 
-                new_data, new_status = fetch_database_entries()
+                new_entry, new_status = fetch_latest_entry()
                 if new_status == 200:
-                    st.session_state.nutrition_data = new_data
+                    st.session_state.latest_entry = new_entry
                     st.session_state.fetch_status = new_status
             else:
                 st.error(f"Failed to upload or process the document: {result.get('message', '')}")
@@ -121,10 +178,10 @@ else:
         st.write("#")
         st.title("🌾🍀 Nutrition Dashboard 🍴🍇")
 
-        data = st.session_state.nutrition_data
+        latest_entry = st.session_state.latest_entry
         status = st.session_state.fetch_status
 
-        if status == 200 and not data.empty:
+        if status == 200:
             nutrition_columns = [
                 'id', 'servings_size', 'servings_per_container', 'calories_per_serving', 
                 'total_fat_amount', 'total_fat_dv', 'saturated_fat_amount', 
@@ -138,9 +195,6 @@ else:
                 'potassium_amount', 'potassium_dv'
             ]
 
-            nutrition_info = data[nutrition_columns] 
-            latest_entry = nutrition_info.iloc[-1] 
-
             servings_size = latest_entry['servings_size']
             servings_per_container = latest_entry['servings_per_container']
             calories_per_serving = latest_entry['calories_per_serving']
@@ -489,7 +543,10 @@ else:
             st.subheader("📉 Nutrition Information Table 📊")
             st.markdown("***")
             
-            st.dataframe(nutrition_info) 
+            if st.checkbox("Show all my entries"):
+                entries, entries_status = fetch_database_entries()
+                if entries_status == 200 and not entries.empty:
+                    st.dataframe(entries[nutrition_columns])
 
         else:
             st.error("Failed to fetch data from the database or no entries available.")
@@ -500,5 +557,8 @@ else:
         if st.button("Logout"):
             st.session_state.logged_in = False
             st.session_state.email = None
+            st.session_state.token = None
+            st.session_state.pop("latest_entry", None)
+            st.session_state.pop("entries_cache", None)
             st.success("Logged out successfully!")
             st.rerun()  
\ No newline at end of file
@@ -0,0 +1,85 @@
+import re
+
+# string column -> (numeric column, canonical unit)
+AMOUNT_COLUMNS = {
+    'calories_per_serving': ('calories_kcal', 'kcal'),
+    'total_fat_amount': ('total_fat_g', 'g'),
+    'saturated_fat_amount': ('saturated_fat_g', 'g'),
+    'trans_fat_amount': ('trans_fat_g', 'g'),
+    'cholesterol_amount': ('cholesterol_mg', 'mg'),
+    'sodium_amount': ('sodium_mg', 'mg'),
+    'total_carbohydrates_amount': ('total_carbohydrates_g', 'g'),
+    'dietary_fiber_amount': ('dietary_fiber_g', 'g'),
+    'total_sugars_amount': ('total_sugars_g', 'g'),
+    'added_sugars_amount': ('added_sugars_g', 'g'),
+    'protein_amount': ('protein_g', 'g'),
+    'vitamin_d_amount': ('vitamin_d_mcg', 'mcg'),
+    'calcium_amount': ('calcium_mg', 'mg'),
+    'iron_amount': ('iron_mg', 'mg'),
+    'potassium_amount': ('potassium_mg', 'mg'),
+}
+
+# string column -> numeric column holding the daily value in percent
+PERCENT_COLUMNS = {
+    column: column.replace('_dv', '_dv_pct')
+    for column in [
+        'total_fat_dv', 'saturated_fat_dv', 'trans_fat_dv', 'cholesterol_dv',
+        'sodium_dv', 'total_carbohydrates_dv', 'dietary_fiber_dv', 'total_sugars_dv',
+        'added_sugars_dv', 'protein_dv', 'vitamin_d_dv', 'calcium_dv', 'iron_dv', 'potassium_dv'
+    ]
+}
+
+COUNT_COLUMNS = {
+    'servings_per_container': 'servings_per_container_count',
+}
+
+NUMERIC_COLUMNS = [column for column, _ in AMOUNT_COLUMNS.values()] + list(PERCENT_COLUMNS.values()) + list(COUNT_COLUMNS.values())
+
+# mass units in milligrams; kcal only converts to itself
+MASS_IN_MG = {'g': 1000.0, 'mg': 1.0, 'mcg': 0.001}
+
+NUMBER_REGEX = re.compile(r"(\d+(?:,\d+)*(?:\.\d+)?)\s*(mcg|µg|ug|mg|g|kcal|cal|%)?", re.IGNORECASE)
+# "1,5g" is a decimal comma; in "1,200mg" the comma separates thousands
+DECIMAL_COMMA_REGEX = re.compile(r"\d+,\d{1,2}")
+
+def to_float(number):
+    if DECIMAL_COMMA_REGEX.fullmatch(number):
+        return float(number.replace(',', '.'))
+    return float(number.replace(',', ''))
+
+def parse_number(text):
+    """first number in text with the unit written after it, e.g. "140mg" -> (140.0, 'mg')"""
+    if not text:
+        return None, None
+    match = NUMBER_REGEX.search(str(text))
+    if not match:
+        return None, None
+    unit = (match.group(2) or '').lower()
+    unit = {'µg': 'mcg', 'ug': 'mcg', 'cal': 'kcal'}.get(unit, unit)
+    return to_float(match.group(1)), unit or None
+
+def parse_amount(text, canonical_unit):
+    """amount converted to canonical_unit; a missing unit is taken to be canonical"""
+    value, unit = parse_number(text)
+    if value is None or unit in (None, canonical_unit):
+        return value
+    if unit in MASS_IN_MG and canonical_unit in MASS_IN_MG:
+        return value * MASS_IN_MG[unit] / MASS_IN_MG[canonical_unit]
+    return None
+
+def parse_percent(text):
+    value, unit = parse_number(text)
+    if unit not in (None, '%'):
+        return None
+    return value
+
+def numeric_values(values):
+    """numeric column values for a dict of Nutrition string columns"""
+    numeric = {}
+    for column, (numeric_column, unit) in AMOUNT_COLUMNS.items():
+        numeric[numeric_column] = parse_amount(values.get(column), unit)
+    for column, numeric_column in PERCENT_COLUMNS.items():
+        numeric[numeric_column] = parse_percent(values.get(column))
+    for column, numeric_column in COUNT_COLUMNS.items():
+        numeric[numeric_column] = parse_number(values.get(column))[0]
+    return numeric